@@ -1,297 +1,258 @@
-import pygame
-import sys
-import numpy as np
-import math
-import random
-
-# Game settings
-ROW_COUNT = 6
-COLUMN_COUNT = 7
-SQUARESIZE = 100
-RADIUS = int(SQUARESIZE/2 - 5)
-WIDTH = COLUMN_COUNT * SQUARESIZE
-HEIGHT = (ROW_COUNT + 1) * SQUARESIZE
-SIZE = (WIDTH, HEIGHT)
-
-# Colors
-BLUE = (0, 0, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-YELLOW = (255, 255, 0)
-WHITE = (255, 255, 255)
-
-PLAYER = 0
-AI = 1
-EMPTY = 0
-PLAYER_PIECE = 1
-AI_PIECE = 2
-WINDOW_LENGTH = 4
-
-pygame.init()
-FONT = pygame.font.SysFont("monospace", 50)
-screen = pygame.display.set_mode(SIZE)
-
-def create_board():
-    return np.zeros((ROW_COUNT, COLUMN_COUNT))
-
-def drop_piece(board, row, col, piece):
-    board[row][col] = piece
-
-def is_valid_location(board, col):
-    return board[0][col] == 0
-
-def get_next_open_row(board, col):
-    for r in range(ROW_COUNT-1, -1, -1):
-        if board[r][col] == 0:
-            return r
-
-def winning_move(board, piece):
-    for c in range(COLUMN_COUNT - 3):
-        for r in range(ROW_COUNT):
-            if all([board[r][c+i] == piece for i in range(4)]):
-                return True
-    for c in range(COLUMN_COUNT):
-        for r in range(ROW_COUNT - 3):
-            if all([board[r+i][c] == piece for i in range(4)]):
-                return True
-    for c in range(COLUMN_COUNT - 3):
-        for r in range(ROW_COUNT - 3):
-            if all([board[r+i][c+i] == piece for i in range(4)]):
-                return True
-    for c in range(COLUMN_COUNT - 3):
-        for r in range(3, ROW_COUNT):
-            if all([board[r-i][c+i] == piece for i in range(4)]):
-                return True
-    return False
-
-def draw_board(board, player_color, ai_color):
-    for c in range(COLUMN_COUNT):
-        for r in range(ROW_COUNT):
-            pygame.draw.rect(screen, BLUE, (c*SQUARESIZE, (r+1)*SQUARESIZE, SQUARESIZE, SQUARESIZE))
-            color = BLACK
-            if board[r][c] == PLAYER_PIECE:
-                color = player_color
-            elif board[r][c] == AI_PIECE:
-                color = ai_color
-            pygame.draw.circle(screen, color, (int(c*SQUARESIZE + SQUARESIZE/2), int((r+1)*SQUARESIZE + SQUARESIZE/2)), RADIUS)
-    pygame.display.update()
-
-def evaluate_window(window, piece):
-    score = 0
-    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
-
-    if window.count(piece) == 4:
-        score += 100
-    elif window.count(piece) == 3 and window.count(EMPTY) == 1:
-        score += 10
-    elif window.count(piece) == 2 and window.count(EMPTY) == 2:
-        score += 5
-
-    if window.count(opp_piece) == 3 and window.count(EMPTY) == 1:
-        score -= 80
-    return score
-
-def score_position(board, piece):
-    score = 0
-    center_array = [int(i) for i in list(board[:, COLUMN_COUNT//2])]
-    center_count = center_array.count(piece)
-    score += center_count * 6
-
-    for r in range(ROW_COUNT):
-        row_array = [int(i) for i in list(board[r,:])]
-        for c in range(COLUMN_COUNT - 3):
-            window = row_array[c:c+WINDOW_LENGTH]
-            score += evaluate_window(window, piece)
-
-    for c in range(COLUMN_COUNT):
-        col_array = [int(i) for i in list(board[:,c])]
-        for r in range(ROW_COUNT - 3):
-            window = col_array[r:r+WINDOW_LENGTH]
-            score += evaluate_window(window, piece)
-
-    for r in range(ROW_COUNT - 3):
-        for c in range(COLUMN_COUNT - 3):
-            window = [board[r+i][c+i] for i in range(WINDOW_LENGTH)]
-            score += evaluate_window(window, piece)
-
-    for r in range(ROW_COUNT - 3):
-        for c in range(COLUMN_COUNT - 3):
-            window = [board[r+3-i][c+i] for i in range(WINDOW_LENGTH)]
-            score += evaluate_window(window, piece)
-
-    return score
-
-def get_valid_locations(board):
-    return [c for c in range(COLUMN_COUNT) if is_valid_location(board, c)]
-
-def is_terminal_node(board):
-    return winning_move(board, PLAYER_PIECE) or winning_move(board, AI_PIECE) or len(get_valid_locations(board)) == 0
-
-def minimax(board, depth, alpha, beta, maximizingPlayer):
-    valid_locations = get_valid_locations(board)
-    terminal = is_terminal_node(board)
-    if depth == 0 or terminal:
-        if terminal:
-            if winning_move(board, AI_PIECE):
-                return (None, 1000000)
-            elif winning_move(board, PLAYER_PIECE):
-                return (None, -1000000)
-            else:
-                return (None, 0)
-        else:
-            return (None, score_position(board, AI_PIECE))
-
-    if maximizingPlayer:
-        value = -math.inf
-        best_col = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, AI_PIECE)
-            new_score = minimax(b_copy, depth-1, alpha, beta, False)[1]
-            if new_score > value:
-                value = new_score
-                best_col = col
-            alpha = max(alpha, value)
-            if alpha >= beta:
-                break
-        return best_col, value
-    else:
-        value = math.inf
-        best_col = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, PLAYER_PIECE)
-            new_score = minimax(b_copy, depth-1, alpha, beta, True)[1]
-            if new_score < value:
-                value = new_score
-                best_col = col
-            beta = min(beta, value)
-            if alpha >= beta:
-                break
-        return best_col, value
-
-def get_ai_depth(level):
-    if level == "easy":
-        return 2
-    elif level == "hard":
-        return 6
-
-def choose_difficulty():
-    font = pygame.font.SysFont("monospace", 40)
-    easy_button = pygame.Rect(150, 200, 200, 50)
-    hard_button = pygame.Rect(150, 300, 200, 50)
-
-    screen.fill(WHITE)
-    label = font.render("Choose Difficulty:", 1, BLACK)
-    screen.blit(label, (100, 50))
-
-    pygame.draw.rect(screen, BLUE, easy_button)
-    screen.blit(font.render("Easy", 1, WHITE), (easy_button.x + 75, easy_button.y + 10))
-
-    pygame.draw.rect(screen, BLUE, hard_button)
-    screen.blit(font.render("Hard", 1, WHITE), (hard_button.x + 75, hard_button.y + 10))
-
-    pygame.display.update()
-
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                pos = pygame.mouse.get_pos()
-                if easy_button.collidepoint(pos):
-                    return "easy"
-                if hard_button.collidepoint(pos):
-                    return "hard"
-
-def choose_color():
-    font = pygame.font.SysFont("monospace", 40)
-    red_button = pygame.Rect(150, 200, 200, 50)
-    yellow_button = pygame.Rect(150, 300, 200, 50)
-
-    screen.fill(WHITE)
-    label = font.render("Choose Your Color:", 1, BLACK)
-    screen.blit(label, (100, 50))
-
-    pygame.draw.rect(screen, RED, red_button)
-    screen.blit(font.render("Red", 1, WHITE), (red_button.x + 75, red_button.y + 10))
-
-    pygame.draw.rect(screen, YELLOW, yellow_button)
-    screen.blit(font.render("Yellow", 1, BLACK), (yellow_button.x + 50, yellow_button.y + 10))
-
-    pygame.display.update()
-
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                pos = pygame.mouse.get_pos()
-                if red_button.collidepoint(pos):
-                    return RED
-                if yellow_button.collidepoint(pos):
-                    return YELLOW
-
-# Game Start
-difficulty = choose_difficulty()
-player_color = choose_color()
-ai_color = YELLOW if player_color == RED else RED
-ai_depth = get_ai_depth(difficulty)
-
-board = create_board()
-game_over = False
-turn = random.randint(PLAYER, AI)
-draw_board(board, player_color, ai_color)
-
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            sys.exit()
-
-        if not game_over:
-            if event.type == pygame.MOUSEMOTION:
-                pygame.draw.rect(screen, BLACK, (0, 0, WIDTH, SQUARESIZE))
-                pygame.draw.circle(screen, player_color, (event.pos[0], int(SQUARESIZE/2)), RADIUS)
-                pygame.display.update()
-
-            if event.type == pygame.MOUSEBUTTONDOWN and turn == PLAYER:
-                col = int(event.pos[0] / SQUARESIZE)
-
-                if is_valid_location(board, col):
-                    row = get_next_open_row(board, col)
-                    drop_piece(board, row, col, PLAYER_PIECE)
-
-                    if winning_move(board, PLAYER_PIECE):
-                        pygame.draw.rect(screen, BLACK, (0, 0, WIDTH, SQUARESIZE))
-                        label = FONT.render("You win!", 1, player_color)
-                        screen.blit(label, (40, 10))
-                        game_over = True
-
-                    turn = AI
-                    draw_board(board, player_color, ai_color)
-
-    if turn == AI and not game_over:
-        col, _ = minimax(board, ai_depth, -math.inf, math.inf, True)
-        if is_valid_location(board, col):
-            row = get_next_open_row(board, col)
-            drop_piece(board, row, col, AI_PIECE)
-
-            if winning_move(board, AI_PIECE):
-                pygame.draw.rect(screen, BLACK, (0, 0, WIDTH, SQUARESIZE))
-                label = FONT.render("AI wins!", 1, ai_color)
-                screen.blit(label, (40, 10))
-                game_over = True
-
-            draw_board(board, player_color, ai_color)
-            turn = PLAYER
-
-    if game_over:
-        pygame.display.update()
-        pygame.time.wait(3000)
-        board = create_board()
-        game_over = False
-        draw_board(board, player_color, ai_color)
+import pygame
+import sys
+import os
+import random
+from connf_ai.bitboard import ROW_COUNT, COLUMN_COUNT, PLAYER, AI, PLAYER_PIECE, AI_PIECE
+from connf_ai.bitboard import create_board, drop_piece, is_valid_location, get_next_open_row, winning_move
+from connf_ai.evaluation import DEFENSIVE
+from connf_ai.records import RecordWriter, DRAW, FLAG_SOLVER, FLAG_PONDER
+from connf_ai.render import BoardRenderer
+from connf_ai.solver import SOLVE_FROM
+from connf_ai.worker import SearchWorker, THINKING
+
+# Game settings
+SQUARESIZE = 100
+RADIUS = int(SQUARESIZE/2 - 5)
+WIDTH = COLUMN_COUNT * SQUARESIZE
+HEIGHT = (ROW_COUNT + 1) * SQUARESIZE
+SIZE = (WIDTH, HEIGHT)
+
+# Colors
+BLUE = (0, 0, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+YELLOW = (255, 255, 0)
+WHITE = (255, 255, 255)
+
+# Processes the AI search is split across, at most one per column
+AI_WORKERS = min(os.cpu_count() or 1, COLUMN_COUNT)
+# Set CONNF_STATS_LOG to a file name to log search statistics for every AI
+# move as JSON lines. They come from the single process search.
+AI_STATS_LOG = os.environ.get("CONNF_STATS_LOG")
+EVALUATOR = DEFENSIVE
+# Search the AI's answers while the player is thinking
+PONDER = True
+# Every game is appended to this file (see connf_ai/records.py); set
+# CONNF_GAME_RECORDS to another file, or to nothing to keep no records
+GAME_RECORDS = os.environ.get("CONNF_GAME_RECORDS", "games.c4r") or None
+# Search results are kept across games in this file (see connf_ai/cache.py); set
+# CONNF_RESULT_CACHE to another file, or to nothing to start every search cold
+RESULT_CACHE = os.environ.get("CONNF_RESULT_CACHE", "results.c4c") or None
+
+# Display and fonts, created by main() so importing this module stays cheap
+# and headless
+screen = None
+FONT = None
+SMALL_FONT = None
+renderer = None
+
+def init_display():
+    global screen, FONT, SMALL_FONT
+    pygame.init()
+    FONT = pygame.font.SysFont("monospace", 50)
+    SMALL_FONT = pygame.font.SysFont("monospace", 25)
+    screen = pygame.display.set_mode(SIZE)
+
+def draw_board(board, player_color, ai_color):
+    # The renderer only redraws the cells that changed since the last call
+    global renderer
+    if renderer is None:
+        renderer = BoardRenderer(screen, ROW_COUNT, COLUMN_COUNT, SQUARESIZE, RADIUS,
+                                 {PLAYER_PIECE: player_color, AI_PIECE: ai_color})
+    renderer.draw(board)
+
+def draw_thinking(nodes):
+    # Search progress in the right half of the top strip
+    area = (WIDTH // 2, 0, WIDTH // 2, SQUARESIZE)
+    pygame.draw.rect(screen, BLACK, area)
+    label = SMALL_FONT.render("thinking %d" % nodes, 1, WHITE)
+    screen.blit(label, (WIDTH // 2 + 10, SQUARESIZE // 2 - 15))
+    renderer.mark(area)
+
+def get_ai_time_budget(level):
+    # Milliseconds the AI may think per move
+    if level == "easy":
+        return 100
+    elif level == "hard":
+        return 1000
+    elif level == "expert":
+        # Used until the board holds SOLVE_FROM stones and the solver takes over
+        return 1000
+
+def get_ai_depth(level):
+    # Deepest search allowed within the time budget; None means no limit
+    if level == "easy":
+        return 2
+    elif level == "hard" or level == "expert":
+        return None
+
+def choose_difficulty():
+    font = pygame.font.SysFont("monospace", 40)
+    easy_button = pygame.Rect(150, 200, 200, 50)
+    hard_button = pygame.Rect(150, 300, 200, 50)
+    expert_button = pygame.Rect(150, 400, 200, 50)
+
+    screen.fill(WHITE)
+    label = font.render("Choose Difficulty:", 1, BLACK)
+    screen.blit(label, (100, 50))
+
+    pygame.draw.rect(screen, BLUE, easy_button)
+    screen.blit(font.render("Easy", 1, WHITE), (easy_button.x + 75, easy_button.y + 10))
+
+    pygame.draw.rect(screen, BLUE, hard_button)
+    screen.blit(font.render("Hard", 1, WHITE), (hard_button.x + 75, hard_button.y + 10))
+
+    pygame.draw.rect(screen, BLUE, expert_button)
+    screen.blit(font.render("Expert", 1, WHITE), (expert_button.x + 28, expert_button.y + 10))
+    # Without an opening book the solver's play is exact only late in the game
+    caption = SMALL_FONT.render("plays like Hard, exact from stone %d" % SOLVE_FROM, 1, BLACK)
+    screen.blit(caption, ((WIDTH - caption.get_width()) // 2, expert_button.bottom + 10))
+
+    pygame.display.update()
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                pos = pygame.mouse.get_pos()
+                if easy_button.collidepoint(pos):
+                    return "easy"
+                if hard_button.collidepoint(pos):
+                    return "hard"
+                if expert_button.collidepoint(pos):
+                    return "expert"
+
+def choose_color():
+    font = pygame.font.SysFont("monospace", 40)
+    red_button = pygame.Rect(150, 200, 200, 50)
+    yellow_button = pygame.Rect(150, 300, 200, 50)
+
+    screen.fill(WHITE)
+    label = font.render("Choose Your Color:", 1, BLACK)
+    screen.blit(label, (100, 50))
+
+    pygame.draw.rect(screen, RED, red_button)
+    screen.blit(font.render("Red", 1, WHITE), (red_button.x + 75, red_button.y + 10))
+
+    pygame.draw.rect(screen, YELLOW, yellow_button)
+    screen.blit(font.render("Yellow", 1, BLACK), (yellow_button.x + 50, yellow_button.y + 10))
+
+    pygame.display.update()
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                pos = pygame.mouse.get_pos()
+                if red_button.collidepoint(pos):
+                    return RED
+                if yellow_button.collidepoint(pos):
+                    return YELLOW
+
+def main():
+    init_display()
+    difficulty = choose_difficulty()
+    player_color = choose_color()
+    ai_color = YELLOW if player_color == RED else RED
+    ai_time_budget = get_ai_time_budget(difficulty)
+    ai_depth = get_ai_depth(difficulty)
+
+    board = create_board()
+    # Searches in a child process kept for the whole session, so each AI turn
+    # starts from what earlier ones found
+    worker = SearchWorker(EVALUATOR, perfect=difficulty == "expert",
+                          workers=1 if AI_STATS_LOG else AI_WORKERS, stats_log=AI_STATS_LOG,
+                          cache_path=RESULT_CACHE)
+    flags = (FLAG_SOLVER if difficulty == "expert" else 0) | (FLAG_PONDER if PONDER else 0)
+    records = RecordWriter(GAME_RECORDS, "defensive", ai_time_budget, ai_depth, flags)
+    clock = pygame.time.Clock()
+    game_over = False
+    turn = random.randint(PLAYER, AI)
+    records.start(PLAYER_PIECE if turn == PLAYER else AI_PIECE)
+    draw_board(board, player_color, ai_color)
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                worker.close()
+                records.close()
+                sys.exit()
+
+            if not game_over:
+                if event.type == pygame.MOUSEMOTION:
+                    renderer.hover(event.pos[0], player_color)
+
+                if event.type == pygame.MOUSEBUTTONDOWN and turn == PLAYER:
+                    col = int(event.pos[0] / SQUARESIZE)
+
+                    if is_valid_location(board, col):
+                        row = get_next_open_row(board, col)
+                        drop_piece(board, row, col, PLAYER_PIECE)
+                        records.move(col)
+
+                        if winning_move(board, PLAYER_PIECE):
+                            records.finish(PLAYER_PIECE)
+                            renderer.clear_strip()
+                            label = FONT.render("You win!", 1, player_color)
+                            screen.blit(label, (40, 10))
+                            game_over = True
+                        elif board.is_full():
+                            records.finish(DRAW)
+                            renderer.clear_strip()
+                            label = FONT.render("Draw!", 1, WHITE)
+                            screen.blit(label, (40, 10))
+                            game_over = True
+
+                        turn = AI
+                        draw_board(board, player_color, ai_color)
+
+        if turn == AI and not game_over:
+            if not worker.busy:
+                worker.start(board, ai_time_budget, ai_depth)
+            col = worker.poll()
+            if col is THINKING:
+                draw_thinking(worker.nodes)
+            elif is_valid_location(board, col):
+                # The node count goes with the thinking
+                renderer.clear_strip()
+                row = get_next_open_row(board, col)
+                drop_piece(board, row, col, AI_PIECE)
+                records.move(col)
+
+                if winning_move(board, AI_PIECE):
+                    records.finish(AI_PIECE)
+                    renderer.clear_strip()
+                    label = FONT.render("AI wins!", 1, ai_color)
+                    screen.blit(label, (40, 10))
+                    game_over = True
+                elif board.is_full():
+                    records.finish(DRAW)
+                    renderer.clear_strip()
+                    label = FONT.render("Draw!", 1, WHITE)
+                    screen.blit(label, (40, 10))
+                    game_over = True
+
+                draw_board(board, player_color, ai_color)
+                turn = PLAYER
+                if PONDER and not game_over:
+                    worker.ponder(board, ai_time_budget, ai_depth)
+
+        if game_over:
+            worker.cancel()
+            renderer.flush()
+            pygame.time.wait(3000)
+            board = create_board()
+            game_over = False
+            records.start(PLAYER_PIECE if turn == PLAYER else AI_PIECE)
+            draw_board(board, player_color, ai_color)
+
+        # One display update per frame, for just the areas drawn on
+        renderer.flush()
+        clock.tick(60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import backend
+from .backend import ROW_COUNT, COLUMN_COUNT, PLAYER_PIECE, AI_PIECE
+from .bitboard import create_board
+from .evaluation import PRESETS
+from .search import Search
+from .transposition import TranspositionTable
+
+# Engines are named on the command line as "kind" or "kind:arg":
+#   random            uniformly random legal move
+#   greedy            backend.pick_best_move
+#   minimax:D         backend.minimax to depth D
+#   search:D[:EVAL]   Search to depth D with an evaluator from PRESETS
+#   timed:MS[:EVAL]   Search, iterative deepening for MS milliseconds
+KINDS = ("random", "greedy", "minimax", "search", "timed")
+
+def parse_engine(spec):
+    kind, _, arg = spec.partition(":")
+    arg, _, preset = arg.partition(":")
+    if kind not in KINDS:
+        raise ValueError("unknown engine %r" % spec)
+    if preset and (kind not in ("search", "timed") or preset not in PRESETS):
+        raise ValueError("engine %r: evaluators are %s" % (spec, ", ".join(PRESETS)))
+    if kind in ("minimax", "search", "timed"):
+        if not arg.isdigit():
+            raise ValueError("engine %r needs a number, e.g. %s:4" % (spec, kind))
+        return kind, int(arg), PRESETS[preset or "default"]
+    return kind, None, None
+
+class Engine:
+    # One per side per game, so tables and history never leak between games
+    def __init__(self, spec):
+        self.kind, self.arg, evaluator = parse_engine(spec)
+        self.search = None
+        if self.kind in ("search", "timed"):
+            self.search = Search(evaluator, TranspositionTable(1 << 16))
+
+    def move(self, board, position, piece):
+        if self.kind == "random":
+            return random.choice(backend.get_valid_locations(board))
+        if self.kind == "greedy":
+            return backend.pick_best_move(board, piece)
+        if self.kind == "minimax":
+            # backend.minimax always maximizes for AI_PIECE
+            if piece != AI_PIECE:
+                cells = np.asarray(board)
+                board = np.where(cells == 0, 0, PLAYER_PIECE + AI_PIECE - cells)
+            return backend.minimax(board, self.arg, -math.inf, math.inf, True)[0]
+        if self.kind == "search":
+            return self.search.minimax(position, self.arg, -math.inf, math.inf, piece == AI_PIECE)[0]
+        return self.search.iterative_deepening(position, self.arg, piece == AI_PIECE)[0]
+
+def random_opening(rng, plies):
+    # Random moves that neither win nor leave a win on the spot, so the
+    # engines get a playable position
+    while True:
+        board = create_board()
+        moves = []
+        for _ in range(plies):
+            cols = [col for col in range(COLUMN_COUNT) if board.can_play(col)]
+            col = rng.choice(cols)
+            board.play(col)
+            moves.append(col)
+            if board.last_move_wins():
+                break
+        else:
+            if not any(_wins(board, col) for col in range(COLUMN_COUNT) if board.can_play(col)):
+                return moves
+
+def _wins(board, col):
+    board.play(col)
+    won = board.last_move_wins()
+    board.undo()
+    return won
+
+def play_game(first, second, opening, seed):
+    # Plays one game and returns (result, first's move times, second's move
+    # times, moves); result is 1 if `first` won, -1 if it lost, 0 on a draw.
+    # `first` moves first after the opening.
+    random.seed(seed)
+    engines = {PLAYER_PIECE: Engine(first), AI_PIECE: Engine(second)}
+    times = {PLAYER_PIECE: [], AI_PIECE: []}
+    board = backend.create_board()
+    position = create_board()
+    # The opening is played so that PLAYER_PIECE is the one to move after it
+    piece = PLAYER_PIECE if len(opening) % 2 == 0 else AI_PIECE
+    moves = []
+    for col in opening:
+        backend.drop_piece(board, backend.get_next_open_row(board, col), col, piece)
+        position.set_turn(piece)
+        position.play(col)
+        moves.append(col)
+        piece = PLAYER_PIECE + AI_PIECE - piece
+    result = 0
+    while len(moves) < ROW_COUNT * COLUMN_COUNT:
+        start = time.perf_counter()
+        col = engines[piece].move(board, position, piece)
+        times[piece].append(time.perf_counter() - start)
+        if col is None or not backend.is_valid_location(board, col):
+            # An illegal move loses
+            result = -1 if piece == PLAYER_PIECE else 1
+            break
+        backend.drop_piece(board, backend.get_next_open_row(board, col), col, piece)
+        position.set_turn(piece)
+        position.play(col)
+        moves.append(col)
+        if backend.winning_move(board, piece):
+            result = 1 if piece == PLAYER_PIECE else -1
+            break
+        piece = PLAYER_PIECE + AI_PIECE - piece
+    return result, times[PLAYER_PIECE], times[AI_PIECE], moves
+
+def _play(task):
+    return play_game(*task)
+
+def elo(score, games):
+    # Elo difference for a score fraction, with a 95% margin from the
+    # standard error of the score
+    if games == 0:
+        return 0.0, math.inf
+    s = min(max(score, 0.5 / games), 1 - 0.5 / games)
+    diff = -400 * math.log10(1 / s - 1)
+    margin = 1.96 * math.sqrt(s * (1 - s) / games)
+    high = min(s + margin, 1 - 0.5 / games)
+    low = max(s - margin, 0.5 / games)
+    return diff, (-400 * math.log10(1 / high - 1) + 400 * math.log10(1 / low - 1)) / 2
+
+def percentiles(times, points=(50, 90, 99)):
+    # Nearest-rank percentiles, in milliseconds
+    if not times:
+        return [0.0] * (len(points) + 1)
+    times = sorted(times)
+    values = [times[min(len(times) - 1, max(0, math.ceil(p / 100 * len(times)) - 1))] * 1000 for p in points]
+    return values + [times[-1] * 1000]
+
+def run_match(engine_a, engine_b, games=100, plies=4, workers=None, seed=None):
+    parse_engine(engine_a)
+    parse_engine(engine_b)
+    rng = random.Random(seed)
+    # Every opening is played twice with the colours swapped
+    tasks = []
+    for _ in range((games + 1) // 2):
+        opening = random_opening(rng, plies)
+        tasks.append((engine_a, engine_b, opening, rng.getrandbits(32)))
+        tasks.append((engine_b, engine_a, opening, rng.getrandbits(32)))
+    tasks = tasks[:games]
+
+    wins = draws = losses = 0
+    times_a = []
+    times_b = []
+    with ProcessPoolExecutor(workers) as pool:
+        for n, (result, first_times, second_times, _) in enumerate(pool.map(_play, tasks, chunksize=4)):
+            if n % 2 == 0:
+                times_a += first_times
+                times_b += second_times
+            else:
+                result = -result
+                times_a += second_times
+                times_b += first_times
+            if result > 0:
+                wins += 1
+            elif result < 0:
+                losses += 1
+            else:
+                draws += 1
+    return {
+        "engines": (engine_a, engine_b),
+        "games": len(tasks),
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "times": (times_a, times_b),
+    }
+
+def report(match):
+    games = match["games"]
+    a, b = match["engines"]
+    print("%s vs %s, %d games" % (a, b, games))
+    print("  win %5.1f%%  draw %5.1f%%  loss %5.1f%%" % tuple(
+        100 * match[key] / games for key in ("wins", "draws", "losses")))
+    diff, margin = elo((match["wins"] + match["draws"] / 2) / games, games)
+    print("  Elo %+.0f +/- %.0f" % (diff, margin))
+    print("  %-14s %9s %9s %9s %9s" % ("ms per move", "p50", "p90", "p99", "max"))
+    for name, times in zip((a, b), match["times"]):
+        print("  %-14s %9.2f %9.2f %9.2f %9.2f" % ((name,) + tuple(percentiles(times))))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m connf_ai.arena", description="Play two engines against each other.")
+    parser.add_argument("engine_a")
+    parser.add_argument("engine_b")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("-p", "--plies", type=int, default=4, help="random opening moves per game")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("-s", "--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    try:
+        match = run_match(args.engine_a, args.engine_b, args.games, args.plies, args.workers, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    report(match)
+
+if __name__ == "__main__":
+    main()
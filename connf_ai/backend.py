@@ -1,166 +1,136 @@
-import numpy as np
-import math
-import random
-
-ROW_COUNT = 6
-COLUMN_COUNT = 7
-PLAYER = 0
-AI = 1
-EMPTY = 0
-PLAYER_PIECE = 1
-AI_PIECE = 2
-WINDOW_LENGTH = 4
-
-def create_board():
-    return np.zeros((ROW_COUNT, COLUMN_COUNT))
-
-def drop_piece(board, row, col, piece):
-    board[row][col] = piece
-
-def is_valid_location(board, col):
-    return board[ROW_COUNT-1][col] == 0
-
-def get_next_open_row(board, col):
-    for r in range(ROW_COUNT):
-        if board[r][col] == 0:
-            return r
-
-def print_board(board):
-    print(np.flip(board, 0))
-
-def winning_move(board, piece):
-    # Check horizontal
-    for c in range(COLUMN_COUNT-3):
-        for r in range(ROW_COUNT):
-            if all(board[r][c+i] == piece for i in range(4)):
-                return True
-
-    # Check vertical
-    for c in range(COLUMN_COUNT):
-        for r in range(ROW_COUNT-3):
-            if all(board[r+i][c] == piece for i in range(4)):
-                return True
-
-    # Check positively sloped diagonals
-    for c in range(COLUMN_COUNT-3):
-        for r in range(ROW_COUNT-3):
-            if all(board[r+i][c+i] == piece for i in range(4)):
-                return True
-
-    # Check negatively sloped diagonals
-    for c in range(COLUMN_COUNT-3):
-        for r in range(3, ROW_COUNT):
-            if all(board[r-i][c+i] == piece for i in range(4)):
-                return True
-
-    return False
-
-def evaluate_window(window, piece):
-    score = 0
-    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
-    if window.count(piece) == 4:
-        score += 100
-    elif window.count(piece) == 3 and window.count(EMPTY) == 1:
-        score += 5
-    elif window.count(piece) == 2 and window.count(EMPTY) == 2:
-        score += 2
-    if window.count(opp_piece) == 3 and window.count(EMPTY) == 1:
-        score -= 4
-    return score
-
-def score_position(board, piece):
-    score = 0
-    center_array = [int(i) for i in list(board[:, COLUMN_COUNT//2])]
-    score += center_array.count(piece) * 3
-
-    # Horizontal
-    for r in range(ROW_COUNT):
-        row_array = [int(i) for i in list(board[r, :])]
-        for c in range(COLUMN_COUNT - 3):
-            window = row_array[c:c+WINDOW_LENGTH]
-            score += evaluate_window(window, piece)
-
-    # Vertical
-    for c in range(COLUMN_COUNT):
-        col_array = [int(i) for i in list(board[:, c])]
-        for r in range(ROW_COUNT - 3):
-            window = col_array[r:r+WINDOW_LENGTH]
-            score += evaluate_window(window, piece)
-
-    # Positive Diagonal
-    for r in range(ROW_COUNT - 3):
-        for c in range(COLUMN_COUNT - 3):
-            window = [board[r+i][c+i] for i in range(WINDOW_LENGTH)]
-            score += evaluate_window(window, piece)
-
-    # Negative Diagonal
-    for r in range(ROW_COUNT - 3):
-        for c in range(COLUMN_COUNT - 3):
-            window = [board[r+3-i][c+i] for i in range(WINDOW_LENGTH)]
-            score += evaluate_window(window, piece)
-
-    return score
-
-def is_terminal_node(board):
-    return winning_move(board, PLAYER_PIECE) or winning_move(board, AI_PIECE) or len(get_valid_locations(board)) == 0
-
-def minimax(board, depth, alpha, beta, maximizingPlayer):
-    valid_locations = get_valid_locations(board)
-    is_terminal = is_terminal_node(board)
-    if depth == 0 or is_terminal:
-        if is_terminal:
-            if winning_move(board, AI_PIECE):
-                return (None, 100000000000000)
-            elif winning_move(board, PLAYER_PIECE):
-                return (None, -100000000000000)
-            else:
-                return (None, 0)
-        return (None, score_position(board, AI_PIECE))
-
-    if maximizingPlayer:
-        value = -math.inf
-        best_col = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, AI_PIECE)
-            new_score = minimax(b_copy, depth-1, alpha, beta, False)[1]
-            if new_score > value:
-                value = new_score
-                best_col = col
-            alpha = max(alpha, value)
-            if alpha >= beta:
-                break
-        return best_col, value
-    else:
-        value = math.inf
-        best_col = random.choice(valid_locations)
-        for col in valid_locations:
-            row = get_next_open_row(board, col)
-            b_copy = board.copy()
-            drop_piece(b_copy, row, col, PLAYER_PIECE)
-            new_score = minimax(b_copy, depth-1, alpha, beta, True)[1]
-            if new_score < value:
-                value = new_score
-                best_col = col
-            beta = min(beta, value)
-            if alpha >= beta:
-                break
-        return best_col, value
-
-def get_valid_locations(board):
-    return [col for col in range(COLUMN_COUNT) if is_valid_location(board, col)]
-
-def pick_best_move(board, piece):
-    valid_locations = get_valid_locations(board)
-    best_score = -10000
-    best_col = random.choice(valid_locations)
-    for col in valid_locations:
-        row = get_next_open_row(board, col)
-        temp_board = board.copy()
-        drop_piece(temp_board, row, col, piece)
-        score = score_position(temp_board, piece)
-        if score > best_score:
-            best_score = score
-            best_col = col
-    return best_col
+import numpy as np
+import random
+from .bitboard import from_rows
+from .evaluation import DEFAULT
+from .search import Search
+
+ROW_COUNT = 6
+COLUMN_COUNT = 7
+PLAYER = 0
+AI = 1
+EMPTY = 0
+PLAYER_PIECE = 1
+AI_PIECE = 2
+WINDOW_LENGTH = 4
+
+class Board:
+    # One byte per cell, row by row with row 0 at the bottom, and the height
+    # of every column. board[r][c] reads and writes a cell through a
+    # memoryview of its row, but stones should go in and out through
+    # play/undo (or drop_piece) so the heights stay right. NumPy functions
+    # see the cells as an int8 (6, 7) array sharing the same memory.
+    __slots__ = ("cells", "heights", "rows")
+
+    def __init__(self, cells=None, heights=None):
+        self.cells = bytearray(ROW_COUNT * COLUMN_COUNT) if cells is None else bytearray(cells)
+        self.heights = [0] * COLUMN_COUNT if heights is None else list(heights)
+        view = memoryview(self.cells)
+        self.rows = [view[r * COLUMN_COUNT:(r + 1) * COLUMN_COUNT] for r in range(ROW_COUNT)]
+
+    def copy(self):
+        return Board(self.cells, self.heights)
+
+    def play(self, col, piece):
+        row = self.heights[col]
+        self.cells[row * COLUMN_COUNT + col] = piece
+        self.heights[col] = row + 1
+        return row
+
+    def undo(self, col):
+        row = self.heights[col] - 1
+        self.cells[row * COLUMN_COUNT + col] = EMPTY
+        self.heights[col] = row
+
+    def __getitem__(self, row):
+        return self.rows[row]
+
+    def __len__(self):
+        return ROW_COUNT
+
+    def __array__(self, dtype=None, copy=None):
+        cells = np.frombuffer(self.cells, dtype=np.int8).reshape(ROW_COUNT, COLUMN_COUNT)
+        if copy or dtype is not None:
+            return cells.astype(cells.dtype if dtype is None else dtype)
+        return cells
+
+    def __getstate__(self):
+        return bytes(self.cells), self.heights
+
+    def __setstate__(self, state):
+        Board.__init__(self, *state)
+
+def create_board():
+    return Board()
+
+def drop_piece(board, row, col, piece):
+    board.cells[row * COLUMN_COUNT + col] = piece
+    board.heights[col] = row + 1
+
+def is_valid_location(board, col):
+    return board.heights[col] < ROW_COUNT
+
+def get_next_open_row(board, col):
+    if board.heights[col] < ROW_COUNT:
+        return board.heights[col]
+
+def print_board(board):
+    print(np.flip(board, 0))
+
+def winning_move(board, piece):
+    # Each slice lines up one cell of every window, so and-ing the four slices
+    # tests all windows of a direction at once
+    b = np.asarray(board) == piece
+
+    # Check horizontal
+    if (b[:, :-3] & b[:, 1:-2] & b[:, 2:-1] & b[:, 3:]).any():
+        return True
+
+    # Check vertical
+    if (b[:-3, :] & b[1:-2, :] & b[2:-1, :] & b[3:, :]).any():
+        return True
+
+    # Check positively sloped diagonals
+    if (b[:-3, :-3] & b[1:-2, 1:-2] & b[2:-1, 2:-1] & b[3:, 3:]).any():
+        return True
+
+    # Check negatively sloped diagonals
+    if (b[3:, :-3] & b[2:-1, 1:-2] & b[1:-2, 2:-1] & b[:-3, 3:]).any():
+        return True
+
+    return False
+
+def evaluate_window(window, piece):
+    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+    return DEFAULT.table[window.count(piece)][window.count(opp_piece)]
+
+# The scoring and the search below run on the bitboard engine; these
+# wrappers keep the NumPy board API
+
+def score_position(board, piece):
+    return DEFAULT.score_position(from_rows(board), piece)
+
+def is_terminal_node(board):
+    return winning_move(board, PLAYER_PIECE) or winning_move(board, AI_PIECE) or len(get_valid_locations(board)) == 0
+
+def minimax(board, depth, alpha, beta, maximizingPlayer):
+    return Search(DEFAULT).minimax(from_rows(board), depth, alpha, beta, maximizingPlayer)
+
+def get_valid_locations(board):
+    return [col for col in range(COLUMN_COUNT) if is_valid_location(board, col)]
+
+def pick_best_move(board, piece):
+    valid_locations = get_valid_locations(board)
+    best_score = -10000
+    best_col = random.choice(valid_locations)
+    cells = np.asarray(board)
+    if np.array_equal(cells, cells[:, ::-1]):
+        # Mirror-image moves score the same, and the first best is on the left
+        valid_locations = [col for col in valid_locations if col <= COLUMN_COUNT // 2]
+    for col in valid_locations:
+        board.play(col, piece)
+        score = score_position(board, piece)
+        board.undo(col)
+        if score > best_score:
+            best_score = score
+            best_col = col
+    return best_col
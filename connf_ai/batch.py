@@ -0,0 +1,64 @@
+import numpy as np
+from .bitboard import ROW_COUNT, COLUMN_COUNT, WINDOW_LENGTH, PLAYER_PIECE, AI_PIECE
+from .evaluation import DEFAULT
+
+# Boards per chunk; each board needs a few hundred bytes of scratch space
+CHUNK_SIZE = 1 << 16
+
+def _window_indices():
+    # Flat cell indices (r * COLUMN_COUNT + c) of every window, shape (69, 4)
+    windows = []
+    # Horizontal
+    for r in range(ROW_COUNT):
+        for c in range(COLUMN_COUNT - 3):
+            windows.append([(r, c+i) for i in range(WINDOW_LENGTH)])
+    # Vertical
+    for c in range(COLUMN_COUNT):
+        for r in range(ROW_COUNT - 3):
+            windows.append([(r+i, c) for i in range(WINDOW_LENGTH)])
+    # Positive Diagonal
+    for r in range(ROW_COUNT - 3):
+        for c in range(COLUMN_COUNT - 3):
+            windows.append([(r+i, c+i) for i in range(WINDOW_LENGTH)])
+    # Negative Diagonal
+    for r in range(ROW_COUNT - 3):
+        for c in range(COLUMN_COUNT - 3):
+            windows.append([(r+3-i, c+i) for i in range(WINDOW_LENGTH)])
+    return np.array([[r * COLUMN_COUNT + c for r, c in window] for window in windows], dtype=np.intp)
+
+WINDOW_INDICES = _window_indices()
+
+def window_counts(boards, piece):
+    # (N, 6, 7) boards -> (N, 69) count of `piece` stones in each window
+    flat = np.asarray(boards).reshape(len(boards), ROW_COUNT * COLUMN_COUNT)
+    return (flat[:, WINDOW_INDICES] == piece).sum(axis=2, dtype=np.int8)
+
+def evaluate_boards(boards, piece, evaluator=DEFAULT):
+    # score_position(board, piece) and winning_move(board, piece) for every
+    # board of an (N, 6, 7) array, in either row orientation
+    boards = np.asarray(boards)
+    opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
+    # table[own][opponent] flattened so one gather scores every window
+    table = np.array(evaluator.table, dtype=np.int64).ravel()
+    scores = np.empty(len(boards), dtype=np.int64)
+    wins = np.empty(len(boards), dtype=bool)
+    for start in range(0, len(boards), CHUNK_SIZE):
+        chunk = np.asarray(boards[start:start + CHUNK_SIZE], dtype=np.int8)
+        mine = window_counts(chunk, piece)
+        theirs = window_counts(chunk, opp_piece)
+        codes = mine.astype(np.intp) * (WINDOW_LENGTH + 1) + theirs
+        center = (chunk[:, :, COLUMN_COUNT // 2] == piece).sum(axis=1)
+        scores[start:start + len(chunk)] = table[codes].sum(axis=1) + center * evaluator.center
+        wins[start:start + len(chunk)] = (mine == WINDOW_LENGTH).any(axis=1)
+    return scores, wins
+
+def score_boards(boards, piece, evaluator=DEFAULT):
+    return evaluate_boards(boards, piece, evaluator)[0]
+
+def winning_moves(boards, piece):
+    boards = np.asarray(boards)
+    wins = np.empty(len(boards), dtype=bool)
+    for start in range(0, len(boards), CHUNK_SIZE):
+        chunk = np.asarray(boards[start:start + CHUNK_SIZE], dtype=np.int8)
+        wins[start:start + len(chunk)] = (window_counts(chunk, piece) == WINDOW_LENGTH).any(axis=1)
+    return wins
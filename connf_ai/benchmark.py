@@ -0,0 +1,302 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from . import backend
+from .bitboard import create_board, make_game, get_next_open_row, winning_move, AI_PIECE, PLAYER_PIECE
+from .evaluation import PRESETS
+from .search import Search, QUIESCENCE_NODES
+from .stats import SearchStats
+from .transposition import TranspositionTable
+
+# Fixed positions as columns played from the empty board, AI to move in each
+CORPUS = {
+    "opening-1": [3, 3],
+    "opening-2": [3, 2, 4, 3],
+    "opening-3": [2, 3, 4, 4, 3, 2],
+    "midgame-1": [3, 3, 3, 2, 4, 4, 2, 1, 5, 3],
+    "midgame-2": [3, 2, 3, 3, 4, 5, 2, 4, 1, 1, 5, 0],
+    "midgame-3": [5, 2, 6, 4, 0, 1, 3, 1, 5, 2, 0, 3, 3, 0],
+    "endgame-1": [5, 3, 4, 2, 1, 1, 3, 6, 2, 5, 2, 3, 6, 0, 4, 1, 3, 2, 5, 5, 5, 2, 3, 2, 3, 1],
+    "endgame-2": [3, 2, 3, 3, 3, 2, 2, 3, 2, 3, 2, 4, 4, 4, 4, 4, 4, 2, 0, 1, 0, 1, 0, 1, 6, 5, 6, 5, 5, 6],
+}
+
+# Target name -> evaluator for the search. "backend" is the NumPy board API
+# of backend.py, whose search is the same engine, so only its leaf functions
+# are timed.
+TARGETS = dict(PRESETS, backend=None)
+
+# (rows, columns, n) of the boards the scaling benchmark searches
+SIZES = [(6, 7, 4), (7, 8, 4), (9, 9, 4), (9, 9, 5)]
+# Openings per size, random moves from a fixed seed
+SCALING_OPENINGS = 4
+SCALING_PLIES = 6
+
+def corpus_positions():
+    positions = {}
+    for name, moves in CORPUS.items():
+        board = create_board()
+        for col in moves:
+            board.play(col)
+        board.set_turn(AI_PIECE)
+        positions[name] = board
+    return positions
+
+def backend_board(position):
+    board = backend.create_board()
+    for c in range(backend.COLUMN_COUNT):
+        for r in range(backend.ROW_COUNT):
+            if position[r][c] == backend.EMPTY:
+                break
+            backend.drop_piece(board, r, c, position[r][c])
+    return board
+
+def search_once(target, position, depth, stats=None, symmetry=True):
+    search = Search(TARGETS[target], TranspositionTable(1 << 16), symmetry=symmetry)
+    search.stats = stats
+    search.minimax(position, depth, -math.inf, math.inf, True)
+    return search.nodes
+
+def bench_search(target, positions, depths):
+    rows = []
+    for depth in depths:
+        nodes = 0
+        start = time.perf_counter()
+        for position in positions.values():
+            nodes += search_once(target, position, depth)
+        elapsed = time.perf_counter() - start
+        # Leaf evaluations are counted in a second, untimed pass
+        evals = 0
+        for position in positions.values():
+            stats = SearchStats()
+            search_once(target, position, depth, stats)
+            evals += stats.evals
+        rows.append({
+            "depth": depth,
+            "seconds": elapsed,
+            "nodes": nodes,
+            "nodes_per_second": nodes / elapsed if elapsed else 0.0,
+            "evals": evals,
+        })
+    return rows
+
+def bench_symmetry(target, positions, depth):
+    # The same searches with and without mirror-image positions sharing
+    # table entries and the root pruned on symmetric boards
+    rows = {}
+    for symmetry in (False, True):
+        stats = SearchStats()
+        nodes = probes = hits = mirror_hits = 0
+        for position in positions.values():
+            nodes += search_once(target, position, depth, stats, symmetry)
+            probes += stats.table_probes
+            hits += stats.table_hits
+            mirror_hits += stats.mirror_hits
+        rows["on" if symmetry else "off"] = {
+            "nodes": nodes,
+            "table_hit_rate": hits / probes if probes else 0.0,
+            "mirror_hit_rate": mirror_hits / probes if probes else 0.0,
+        }
+    return rows
+
+def bench_quiescence(target, positions, depth):
+    # Searches one ply short of `depth` with and without the forced moves
+    # past the limit, and how often each picks the move of a plain search
+    # to `depth`
+    def search(position, depth, quiescence):
+        search = Search(TARGETS[target], TranspositionTable(1 << 16), quiescence=quiescence)
+        start = time.perf_counter()
+        move = search.minimax(position, depth, -math.inf, math.inf, True)[0]
+        return move, search.nodes, time.perf_counter() - start
+    reference = {name: search(position, depth, 0)[0] for name, position in positions.items()}
+    rows = {}
+    for name, quiescence in (("off", 0), ("on", QUIESCENCE_NODES)):
+        nodes = seconds = agree = 0
+        for position_name, position in positions.items():
+            move, n, elapsed = search(position, depth - 1, quiescence)
+            nodes += n
+            seconds += elapsed
+            agree += move == reference[position_name]
+        rows[name] = {"depth": depth - 1, "nodes": nodes, "seconds": seconds, "agreement": agree / len(positions)}
+    return rows
+
+def scaling_positions(game):
+    rng = random.Random(0)
+    positions = [create_board(game)]
+    for _ in range(SCALING_OPENINGS):
+        board = create_board(game)
+        for _ in range(SCALING_PLIES):
+            board.play(rng.choice([col for col in range(game.columns) if board.can_play(col)]))
+        board.set_turn(AI_PIECE)
+        positions.append(board)
+    return positions
+
+def bench_scaling(target, depth, sizes=SIZES):
+    # Nodes per second of the same search on larger boards and longer rows
+    rows = []
+    for size in sizes:
+        game = make_game(*size)
+        nodes = 0
+        start = time.perf_counter()
+        for position in scaling_positions(game):
+            search = Search(TARGETS[target], TranspositionTable(1 << 16))
+            search.minimax(position, depth, -math.inf, math.inf, True)
+            nodes += search.nodes
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "size": "%dx%d connect %d" % size,
+            "seconds": elapsed,
+            "nodes": nodes,
+            "nodes_per_second": nodes / elapsed if elapsed else 0.0,
+        })
+    return rows
+
+def bench_memory(target, positions, depth):
+    # Peak bytes allocated during a search, tracemalloc slows it down so this
+    # is a separate pass
+    tracemalloc.start()
+    try:
+        for position in positions.values():
+            search_once(target, position, depth)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _rate(function, args_list, seconds):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for args in args_list:
+            function(*args)
+        calls += len(args_list)
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+def bench_calls(target, positions, seconds=0.5):
+    # Calls per second of the leaf functions on the corpus positions
+    evaluator = TARGETS[target]
+    if evaluator is None:
+        boards = [backend_board(position) for position in positions.values()]
+        functions = (backend.score_position, backend.winning_move, backend.get_next_open_row)
+    else:
+        boards = list(positions.values())
+        functions = (evaluator.score_position, winning_move, get_next_open_row)
+    score, has_won, next_open_row = functions
+    return {
+        "score_position": _rate(score, [(board, AI_PIECE) for board in boards], seconds),
+        "winning_move": _rate(has_won, [(board, PLAYER_PIECE) for board in boards], seconds),
+        "get_next_open_row": _rate(next_open_row, [(board, col) for board in boards for col in range(backend.COLUMN_COUNT)], seconds),
+    }
+
+# Seconds a fresh interpreter may take to import the engine and get a first
+# move back from a spawned SearchWorker
+COLD_START_BUDGET = 0.5
+
+_COLD_START = """
+import time
+start = time.perf_counter()
+import multiprocessing
+from connf_ai.bitboard import create_board
+from connf_ai.worker import SearchWorker, THINKING
+imported = time.perf_counter()
+multiprocessing.set_start_method("spawn")
+worker = SearchWorker()
+worker.start(create_board(), 10, 1)
+while worker.poll() is THINKING:
+    time.sleep(0.001)
+print(imported - start, time.perf_counter() - start)
+worker.close()
+"""
+
+def cold_start():
+    # The worker is started with "spawn", as on Windows and macOS, so the
+    # child pays for the imports as well
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", _COLD_START], cwd=root, capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    imported, first_move = map(float, output.split())
+    return {
+        "seconds": total,
+        "import_seconds": imported,
+        "first_move_seconds": first_move,
+        "budget": COLD_START_BUDGET,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(targets=tuple(TARGETS), max_depth=8):
+    positions = corpus_positions()
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "positions": list(positions),
+        "cold_start": cold_start(),
+        "targets": {},
+    }
+    for target in targets:
+        result = {"calls_per_second": bench_calls(target, positions)}
+        if TARGETS[target] is not None:
+            searches = bench_search(target, positions, range(1, max_depth + 1))
+            result["search"] = searches
+            result["evals_per_second"] = sum(row["evals"] for row in searches) / sum(row["seconds"] for row in searches)
+            result["peak_memory"] = bench_memory(target, positions, max_depth)
+            result["symmetry"] = bench_symmetry(target, positions, max_depth)
+            result["quiescence"] = bench_quiescence(target, positions, max_depth)
+            result["scaling"] = bench_scaling(target, max_depth)
+        results["targets"][target] = result
+    return results
+
+def report(results):
+    cold = results["cold_start"]
+    print("cold start: %.3f s (import %.3f s, first move %.3f s)%s" % (
+        cold["seconds"], cold["import_seconds"], cold["first_move_seconds"],
+        "" if cold["seconds"] <= cold["budget"] else ", over the %.1f s budget" % cold["budget"]))
+    for target, result in results["targets"].items():
+        if "search" not in result:
+            print("%s:" % target)
+        else:
+            print("%s: %.0f evals/s, peak memory %.1f KiB" % (target, result["evals_per_second"], result["peak_memory"] / 1024))
+            print("  %5s %10s %12s %12s" % ("depth", "seconds", "nodes", "nodes/s"))
+            for row in result["search"]:
+                print("  %5d %10.3f %12d %12.0f" % (row["depth"], row["seconds"], row["nodes"], row["nodes_per_second"]))
+            for name, row in result["symmetry"].items():
+                print("  symmetry %-3s %10d nodes, %5.1f%% table hits, %5.1f%% mirrored" % (
+                    name, row["nodes"], 100 * row["table_hit_rate"], 100 * row["mirror_hit_rate"]))
+            for name, row in result["quiescence"].items():
+                print("  quiescence %-3s %8d nodes at depth %d, %.3f s, %3.0f%% moves as one ply deeper" % (
+                    name, row["nodes"], row["depth"], row["seconds"], 100 * row["agreement"]))
+            for row in result["scaling"]:
+                print("  %-18s %10d nodes %12.0f nodes/s" % (row["size"], row["nodes"], row["nodes_per_second"]))
+        for name, rate in result["calls_per_second"].items():
+            print("  %-18s %12.0f calls/s" % (name, rate))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m connf_ai.benchmark", description="Time the search on a fixed set of positions.")
+    parser.add_argument("targets", nargs="*", help="any of %s (default: all)" % ", ".join(TARGETS))
+    parser.add_argument("-d", "--depth", type=int, default=8, help="deepest search")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    for target in args.targets:
+        if target not in TARGETS:
+            parser.error("unknown target %r" % target)
+    results = run(args.targets or tuple(TARGETS), args.depth)
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+ROW_COUNT = 6
+COLUMN_COUNT = 7
+PLAYER = 0
+AI = 1
+EMPTY = 0
+PLAYER_PIECE = 1
+AI_PIECE = 2
+WINDOW_LENGTH = 4
+
+# Each column takes ROW_COUNT + 1 bits, bit (col * STRIDE + row) with row 0 at
+# the bottom. The spare bit on top of every column stays empty.
+STRIDE = ROW_COUNT + 1
+
+class Game:
+    # Board size and the number in a row that wins, with every mask and
+    # window table the engine needs for them. Get one from make_game(),
+    # which builds each configuration once.
+    def __init__(self, rows, columns, n):
+        if n > max(rows, columns):
+            raise ValueError("%d in a row does not fit on %dx%d" % (n, rows, columns))
+        self.rows = rows
+        self.columns = columns
+        self.n = n
+        self.stride = stride = rows + 1
+        self.cells = rows * columns
+        self.bottom = [1 << (c * stride) for c in range(columns)]
+        self.column_mask = [((1 << rows) - 1) << (c * stride) for c in range(columns)]
+        self.board_mask = sum(self.column_mask)
+        self.bottom_mask = sum(self.bottom)
+        self.center_mask = self.column_mask[columns // 2]
+        # Columns from the center outwards, the order moves are tried in by default
+        self.center_order = sorted(range(columns), key=lambda c: abs(c - columns // 2))
+        # The bit of every cell and of its mirror image, indexed [col][row]
+        self.bits = [[1 << (c * stride + r) for r in range(rows)] for c in range(columns)]
+        self.mirror_bits = self.bits[::-1]
+        self.windows = self._windows()
+        # The windows through each cell, indexed by its bit position, as masks
+        # and as indices into windows
+        self.cell_windows = [[w for w in self.windows if w >> i & 1] for i in range(columns * stride)]
+        self.cell_window_indices = [[k for k, w in enumerate(self.windows) if w >> i & 1] for i in range(columns * stride)]
+
+    def __reduce__(self):
+        # Unpickles through the cache, so a child process shares the tables too
+        return make_game, (self.rows, self.columns, self.n)
+
+    def __repr__(self):
+        return "make_game(%d, %d, %d)" % (self.rows, self.columns, self.n)
+
+    def _windows(self):
+        rows, columns, n = self.rows, self.columns, self.n
+        bit = lambda r, c: 1 << (c * self.stride + r)
+        windows = []
+        # Horizontal
+        for r in range(rows):
+            for c in range(columns - n + 1):
+                windows.append(sum(bit(r, c+i) for i in range(n)))
+        # Vertical
+        for c in range(columns):
+            for r in range(rows - n + 1):
+                windows.append(sum(bit(r+i, c) for i in range(n)))
+        # Positive Diagonal
+        for r in range(rows - n + 1):
+            for c in range(columns - n + 1):
+                windows.append(sum(bit(r+i, c+i) for i in range(n)))
+        # Negative Diagonal
+        for r in range(rows - n + 1):
+            for c in range(columns - n + 1):
+                windows.append(sum(bit(r+n-1-i, c+i) for i in range(n)))
+        return windows
+
+    def alignment(self, stones):
+        # Shift by one cell along each direction (horizontal, vertical and the
+        # two diagonals): runs of k cells and-ed with themselves k cells on are
+        # runs of 2k, until n is reached. The empty spare row keeps runs from
+        # wrapping across columns.
+        n = self.n
+        for shift in (self.stride, 1, self.stride + 1, self.stride - 1):
+            runs = stones
+            length = 1
+            while 2 * length <= n:
+                runs &= runs >> (length * shift)
+                length *= 2
+            if length < n:
+                runs &= runs >> ((n - length) * shift)
+            if runs:
+                return True
+        return False
+
+    def winning_cells(self, stones, mask):
+        # Empty cells that would complete n in a row for `stones`: for each
+        # direction and each place the gap can take in the row, the stones
+        # at the other n - 1 places shifted onto the gap
+        cells = 0
+        n = self.n
+        for shift in (self.stride, 1, self.stride + 1, self.stride - 1):
+            for gap in range(n):
+                r = -1
+                for i in range(n):
+                    if i < gap:
+                        r &= stones << ((gap - i) * shift)
+                    elif i > gap:
+                        r &= stones >> ((i - gap) * shift)
+                cells |= r
+        return cells & (self.board_mask ^ mask)
+
+    def possible(self, mask):
+        return (mask + self.bottom_mask) & self.board_mask
+
+    def mirror(self, bits):
+        column = (1 << self.stride) - 1
+        result = 0
+        for c in range(self.columns):
+            result |= ((bits >> (c * self.stride)) & column) << ((self.columns - 1 - c) * self.stride)
+        return result
+
+# (rows, columns, n) -> Game
+_GAMES = {}
+
+def make_game(rows=ROW_COUNT, columns=COLUMN_COUNT, n=WINDOW_LENGTH):
+    game = _GAMES.get((rows, columns, n))
+    if game is None:
+        game = _GAMES[rows, columns, n] = Game(rows, columns, n)
+    return game
+
+# The standard 6x7 connect four, and its tables under the old names
+STANDARD = make_game()
+BOTTOM = STANDARD.bottom
+COLUMN_MASK = STANDARD.column_mask
+BOARD_MASK = STANDARD.board_mask
+BOTTOM_MASK = STANDARD.bottom_mask
+CENTER_MASK = STANDARD.center_mask
+WINDOWS = STANDARD.windows
+CELL_WINDOWS = STANDARD.cell_windows
+CELL_WINDOW_INDICES = STANDARD.cell_window_indices
+
+def cell_bit(row, col):
+    return 1 << (col * STRIDE + row)
+
+# The functions below work on the standard board only, written out with its
+# constants because the solver and the win checks call them so often
+
+def alignment(stones):
+    # Shift by one cell along each direction (horizontal, vertical and the two
+    # diagonals): a pair of pairs two cells apart is four in a row. The empty
+    # spare row keeps runs from wrapping across columns.
+    for shift in (STRIDE, 1, STRIDE + 1, STRIDE - 1):
+        pairs = stones & (stones >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+def possible(mask):
+    # The cell each non-full column would fill next
+    return (mask + BOTTOM_MASK) & BOARD_MASK
+
+def winning_cells(stones, mask):
+    # Empty cells that would complete four in a row for `stones`, on the
+    # standard board
+    r = (stones << 1) & (stones << 2) & (stones << 3)
+    for shift in (STRIDE, STRIDE - 1, STRIDE + 1):
+        p = (stones << shift) & (stones << 2 * shift)
+        r |= p & (stones << 3 * shift)
+        r |= p & (stones >> shift)
+        p = (stones >> shift) & (stones >> 2 * shift)
+        r |= p & (stones << shift)
+        r |= p & (stones >> 3 * shift)
+    return r & (BOARD_MASK ^ mask)
+
+def mirror(bits):
+    # Reflects a board mask left to right; mirror(a + b) == mirror(a) +
+    # mirror(b) for the masks used here, since no carry crosses a column
+    column = (1 << STRIDE) - 1
+    result = 0
+    for c in range(COLUMN_COUNT):
+        result |= ((bits >> (c * STRIDE)) & column) << ((COLUMN_COUNT - 1 - c) * STRIDE)
+    return result
+
+class Position:
+    # Two masks describe the board: `current` holds the stones of the side to
+    # move and `mask` holds every occupied cell. `piece` is the side to move.
+    # The same two masks of the board mirrored left to right are kept
+    # alongside, so mirrored positions can share cache entries. `game` gives
+    # the board size and the tables that go with it.
+    __slots__ = ("game", "current", "mask", "mirror_current", "mirror_mask", "heights", "piece", "history")
+
+    def __init__(self, game=STANDARD):
+        self.game = game
+        self.current = 0
+        self.mask = 0
+        self.mirror_current = 0
+        self.mirror_mask = 0
+        self.heights = [0] * game.columns
+        self.piece = PLAYER_PIECE
+        self.history = []
+
+    def copy(self):
+        other = Position.__new__(Position)
+        other.game = self.game
+        other.current = self.current
+        other.mask = self.mask
+        other.mirror_current = self.mirror_current
+        other.mirror_mask = self.mirror_mask
+        other.heights = self.heights[:]
+        other.piece = self.piece
+        other.history = self.history[:]
+        return other
+
+    def can_play(self, col):
+        return self.heights[col] < self.game.rows
+
+    def play(self, col):
+        game = self.game
+        height = self.heights[col]
+        self.current ^= self.mask
+        self.mask |= game.bits[col][height]
+        self.mirror_current ^= self.mirror_mask
+        self.mirror_mask |= game.mirror_bits[col][height]
+        self.heights[col] = height + 1
+        self.piece = PLAYER_PIECE + AI_PIECE - self.piece
+        self.history.append(col)
+
+    def undo(self):
+        game = self.game
+        col = self.history.pop()
+        height = self.heights[col] - 1
+        self.heights[col] = height
+        self.mask ^= game.bits[col][height]
+        self.current ^= self.mask
+        self.mirror_mask ^= game.mirror_bits[col][height]
+        self.mirror_current ^= self.mirror_mask
+        self.piece = PLAYER_PIECE + AI_PIECE - self.piece
+
+    def last_move_wins(self):
+        # Only the lines through the last stone played can have been completed
+        if not self.history:
+            return False
+        col = self.history[-1]
+        stones = self.current ^ self.mask
+        for window in self.game.cell_windows[col * self.game.stride + self.heights[col] - 1]:
+            if stones & window == window:
+                return True
+        return False
+
+    def set_turn(self, piece):
+        if piece != self.piece:
+            self.current ^= self.mask
+            self.mirror_current ^= self.mirror_mask
+            self.piece = piece
+
+    def key(self):
+        # current + mask sets the bit above each column's stones, which makes
+        # it unique per position; the low bit tells whose turn it is
+        return (self.current + self.mask) << 1 | (self.piece == AI_PIECE)
+
+    def mirror_key(self):
+        return (self.mirror_current + self.mirror_mask) << 1 | (self.piece == AI_PIECE)
+
+    def canonical_key(self):
+        # The smaller of key() and mirror_key(), and whether it is the
+        # mirrored one; columns stored under it must then be mirrored too
+        key = (self.current + self.mask) << 1 | (self.piece == AI_PIECE)
+        mirrored = (self.mirror_current + self.mirror_mask) << 1 | (self.piece == AI_PIECE)
+        if mirrored < key:
+            return mirrored, True
+        return key, False
+
+    def is_symmetric(self):
+        return self.mask == self.mirror_mask and self.current == self.mirror_current
+
+    def is_full(self):
+        return self.mask == self.game.board_mask
+
+    def pieces(self, piece):
+        if piece == self.piece:
+            return self.current
+        return self.current ^ self.mask
+
+    def cell(self, row, col):
+        bit = self.game.bits[col][row]
+        if not self.mask & bit:
+            return EMPTY
+        if self.current & bit:
+            return self.piece
+        return PLAYER_PIECE + AI_PIECE - self.piece
+
+    def __getitem__(self, row):
+        return _Row(self, row)
+
+class _Row:
+    # Read-only view so callers can keep writing board[r][c].
+    __slots__ = ("position", "row")
+
+    def __init__(self, position, row):
+        self.position = position
+        self.row = row
+
+    def __getitem__(self, col):
+        return self.position.cell(self.row, col)
+
+    def __len__(self):
+        return self.position.game.columns
+
+def create_board(game=STANDARD):
+    return Position(game)
+
+def from_rows(rows, game=STANDARD):
+    # Position from a grid indexed rows[r][c] with row 0 at the bottom, such
+    # as a backend.py Board or a NumPy array. The move order is lost: the
+    # history lists the stones column by column, which keeps its length right.
+    board = Position(game)
+    stones = [0, 0, 0]
+    for c in range(game.columns):
+        for r in range(game.rows):
+            piece = int(rows[r][c])
+            if piece == EMPTY:
+                break
+            stones[piece] |= game.bits[c][r]
+            board.heights[c] += 1
+            board.history.append(c)
+    board.mask = stones[PLAYER_PIECE] | stones[AI_PIECE]
+    board.current = stones[PLAYER_PIECE]
+    board.mirror_mask = game.mirror(board.mask)
+    board.mirror_current = game.mirror(board.current)
+    board.piece = PLAYER_PIECE
+    return board
+
+def drop_piece(board, row, col, piece):
+    board.set_turn(piece)
+    board.play(col)
+
+def is_valid_location(board, col):
+    return board.heights[col] < board.game.rows
+
+def get_next_open_row(board, col):
+    if board.heights[col] < board.game.rows:
+        return board.heights[col]
+
+def get_valid_locations(board):
+    rows = board.game.rows
+    return [col for col, height in enumerate(board.heights) if height < rows]
+
+def print_board(board):
+    for r in range(board.game.rows-1, -1, -1):
+        print([board.cell(r, c) for c in range(board.game.columns)])
+
+def winning_move(board, piece):
+    if board.game is STANDARD:
+        return alignment(board.pieces(piece))
+    return board.game.alignment(board.pieces(piece))
+
+def is_terminal_node(board):
+    return winning_move(board, PLAYER_PIECE) or winning_move(board, AI_PIECE) or board.is_full()
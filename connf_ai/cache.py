@@ -0,0 +1,182 @@
+import os
+import zlib
+import numpy as np
+
+# Search results kept across games and processes in a memory-mapped file:
+# (position, depth, evaluator) -> (best move, value). Every process maps
+# the same file, so a result found by one is there for all of them without
+# copying. The file is a header followed by fixed-size slots grouped into
+# buckets of WAYS; a full bucket evicts with CLOCK.
+CACHE_MAGIC = b"C4RC"
+# 2: the search extends forced moves past the depth limit, which changes
+# the values stored for a depth
+CACHE_VERSION = 2
+WAYS = 4
+
+# magic, format version, slot count, hits, misses, stores. The counters are
+# shared and updated without a lock, so under heavy use they are close
+# rather than exact.
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("slots", "<u8"),
+    ("hits", "<u8"),
+    ("misses", "<u8"),
+    ("stores", "<u8"),
+    ("", "V24"),
+])
+
+# canonical position key, value, check, evaluator version, depth (0 for an
+# empty slot), move (-1 for none), CLOCK reference bit
+SLOT_DTYPE = np.dtype([
+    ("key", "<u8"),
+    ("value", "<i8"),
+    ("check", "<u8"),
+    ("version", "<u4"),
+    ("depth", "i1"),
+    ("move", "i1"),
+    ("ref", "u1"),
+    ("", "V1"),
+])
+
+KEY_MASK = (1 << 64) - 1
+
+def _check(key, value, version, depth, move):
+    # Written last and checked on every hit, so a slot torn by two processes
+    # writing it at once reads as a miss
+    return (key ^ (value & KEY_MASK) ^ version << 32 ^ depth << 8 ^ (move & 0xFF)) & KEY_MASK
+
+class ResultCache:
+    # Opens `path`, creating it with `entries` slots if it does not exist or
+    # was written by another format version. Results are stored under the
+    # smaller of a position's key and its mirror image's, and under the
+    # evaluator's version and the search's quiescence limit, so changed
+    # weights or a search that sees further never get old results.
+    def __init__(self, path, entries=1 << 16):
+        self.path = path
+        buckets = max(1, entries // WAYS)
+        if not self._valid(path):
+            self._create(path, buckets * WAYS)
+        self.header = np.memmap(path, HEADER_DTYPE, "r+", 0, (1,))
+        slots = int(self.header["slots"][0])
+        self.buckets = slots // WAYS
+        self.slots = np.memmap(path, SLOT_DTYPE, "r+", HEADER_DTYPE.itemsize, (self.buckets, WAYS))
+        # Next way the CLOCK hand of each bucket points at
+        self.hands = np.memmap(path, "u1", "r+", HEADER_DTYPE.itemsize + slots * SLOT_DTYPE.itemsize, (self.buckets,))
+        self.versions = {}
+
+    @staticmethod
+    def _valid(path):
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER_DTYPE.itemsize:
+            return False
+        header = np.fromfile(path, HEADER_DTYPE, 1)[0]
+        size = HEADER_DTYPE.itemsize + int(header["slots"]) * (SLOT_DTYPE.itemsize + 1)
+        return (header["magic"] == CACHE_MAGIC and header["version"] == CACHE_VERSION
+                and int(header["slots"]) % WAYS == 0 and os.path.getsize(path) == size)
+
+    @staticmethod
+    def _create(path, slots):
+        header = np.zeros(1, HEADER_DTYPE)
+        header["magic"] = CACHE_MAGIC
+        header["version"] = CACHE_VERSION
+        header["slots"] = slots
+        with open(path, "wb") as f:
+            f.write(header.tobytes())
+            f.truncate(HEADER_DTYPE.itemsize + slots * (SLOT_DTYPE.itemsize + 1))
+
+    def close(self):
+        self.header.flush()
+        self.slots.flush()
+        self.hands.flush()
+
+    def clear(self):
+        self.slots["depth"] = 0
+        self.header["hits"] = self.header["misses"] = self.header["stores"] = 0
+
+    def _version(self, evaluator, game, quiescence):
+        # Positions of different board sizes can share key bits, so the
+        # game is part of the version too
+        version = self.versions.get((evaluator, game, quiescence))
+        if version is None:
+            version = zlib.crc32(repr((evaluator.version, game.rows, game.columns, game.n, quiescence)).encode())
+            self.versions[evaluator, game, quiescence] = version
+        return version
+
+    def _locate(self, board, depth, evaluator, quiescence):
+        key, mirrored = board.canonical_key()
+        if key > KEY_MASK:
+            key = hash(key)
+        version = self._version(evaluator, board.game, quiescence)
+        bucket = (key * 31 + depth) % self.buckets
+        return key, mirrored, version, bucket
+
+    def probe(self, board, depth, evaluator, quiescence):
+        # (move, value) of a search of `board` to `depth`, or None
+        key, mirrored, version, bucket = self._locate(board, depth, evaluator, quiescence)
+        ways = self.slots[bucket]
+        for way in range(WAYS):
+            slot = ways[way]
+            if slot["depth"] == depth and slot["key"] == key and slot["version"] == version:
+                value = int(slot["value"])
+                move = int(slot["move"])
+                if slot["check"] != _check(key, value, version, depth, move):
+                    break
+                slot["ref"] = 1
+                self.header["hits"] += 1
+                if move < 0:
+                    return None, value
+                return (board.game.columns - 1 - move if mirrored else move), value
+        self.header["misses"] += 1
+        return None
+
+    def store(self, board, depth, evaluator, quiescence, move, value):
+        key, mirrored, version, bucket = self._locate(board, depth, evaluator, quiescence)
+        if move is None:
+            move = -1
+        elif mirrored:
+            move = board.game.columns - 1 - move
+        value = int(value)
+        ways = self.slots[bucket]
+        # The same entry, an empty slot, or CLOCK's pick: the hand skips and
+        # clears slots used since it last passed
+        victim = None
+        for way in range(WAYS):
+            slot = ways[way]
+            if slot["depth"] == 0 or (slot["depth"] == depth and slot["key"] == key and slot["version"] == version):
+                victim = way
+                break
+        if victim is None:
+            hand = int(self.hands[bucket])
+            while ways[hand]["ref"]:
+                ways[hand]["ref"] = 0
+                hand = (hand + 1) % WAYS
+            victim = hand
+            self.hands[bucket] = (hand + 1) % WAYS
+        slot = ways[victim]
+        slot["depth"] = 0
+        slot["key"] = key
+        slot["value"] = value
+        slot["version"] = version
+        slot["move"] = move
+        slot["ref"] = 0
+        slot["check"] = _check(key, value, version, depth, move)
+        slot["depth"] = depth
+        self.header["stores"] += 1
+
+    def stats(self):
+        hits = int(self.header["hits"][0])
+        misses = int(self.header["misses"][0])
+        return {
+            "slots": self.buckets * WAYS,
+            "used": int(np.count_nonzero(self.slots["depth"])),
+            "hits": hits,
+            "misses": misses,
+            "stores": int(self.header["stores"][0]),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+if __name__ == "__main__":
+    # python -m connf_ai.cache PATH: prints the counters of a cache file
+    import sys
+    for name, value in ResultCache(sys.argv[1]).stats().items():
+        print("%-9s %s" % (name, value))
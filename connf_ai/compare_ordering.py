@@ -0,0 +1,30 @@
+import math
+import sys
+from .bitboard import create_board
+from .search import Search
+
+# Moves played from the empty board, as column numbers
+POSITIONS = {
+    "empty": [],
+    "opening": [3, 3, 2, 4],
+    "midgame": [3, 3, 3, 2, 4, 4, 2, 1, 5, 3],
+}
+
+def count_nodes(moves, depth, ordering):
+    board = create_board()
+    for col in moves:
+        board.play(col)
+    search = Search(ordering=ordering)
+    search.minimax(board, depth, -math.inf, math.inf, True)
+    return search.nodes
+
+def main(depths=range(4, 9)):
+    print("%-10s %5s %12s %12s %7s" % ("position", "depth", "plain", "ordered", "ratio"))
+    for name, moves in POSITIONS.items():
+        for depth in depths:
+            plain = count_nodes(moves, depth, False)
+            ordered = count_nodes(moves, depth, True)
+            print("%-10s %5d %12d %12d %6.1f%%" % (name, depth, plain, ordered, 100 * ordered / plain))
+
+if __name__ == "__main__":
+    main(range(4, int(sys.argv[1]) + 1) if len(sys.argv) > 1 else range(4, 9))
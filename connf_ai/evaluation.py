@@ -0,0 +1,117 @@
+import zlib
+from .bitboard import PLAYER_PIECE, AI_PIECE, WINDOW_LENGTH
+
+class Evaluator:
+    # Window scores depend only on how many of the window's cells belong to
+    # each side, so evaluate_window collapses into a table indexed by
+    # [own stones][opponent stones]. With N in a row, `three` and `two` are
+    # for N-1 and N-2 stones and the rest of the window empty.
+    def __init__(self, three, two, opp_three, center, win, four=100):
+        self.weights = (three, two, opp_three, four)
+        self.center = center
+        self.win = win
+        # Changes whenever a weight does, for results cached across sessions
+        self.version = zlib.crc32(repr((self.weights, center, win)).encode())
+        # Window length -> its table, built on first use
+        self.tables = {}
+        self.table = self.window_table(WINDOW_LENGTH)
+
+    def window_table(self, n):
+        table = self.tables.get(n)
+        if table is None:
+            three, two, opp_three, four = self.weights
+            table = [[0] * (n + 1) for _ in range(n + 1)]
+            for mine in range(n + 1):
+                for theirs in range(n + 1 - mine):
+                    empty = n - mine - theirs
+                    score = 0
+                    if mine == n:
+                        score += four
+                    elif mine == n - 1 and empty == 1:
+                        score += three
+                    elif mine == n - 2 and empty == 2:
+                        score += two
+                    if theirs == n - 1 and empty == 1:
+                        score += opp_three
+                    table[mine][theirs] = score
+            self.tables[n] = table
+        return table
+
+    def score_position(self, board, piece):
+        game = board.game
+        mine = board.pieces(piece)
+        theirs = mine ^ board.mask
+        occupied = board.mask
+        table = self.window_table(game.n)
+        score = (mine & game.center_mask).bit_count() * self.center
+        for window in game.windows:
+            if occupied & window:
+                score += table[(mine & window).bit_count()][(theirs & window).bit_count()]
+        return score
+
+# Weights of evaluate_window/score_position in backend.py, also used by gui.py
+DEFAULT = Evaluator(three=5, two=2, opp_three=-4, center=3, win=100000000000000)
+# Weights of connect_four.py and finn_four, which weigh blocking the
+# opponent's threes far above building their own
+DEFENSIVE = Evaluator(three=10, two=5, opp_three=-80, center=6, win=1000000)
+
+PRESETS = {
+    "default": DEFAULT,
+    "defensive": DEFENSIVE,
+}
+
+class IncrementalScore:
+    # score_position for both sides, kept up to date as stones are added and
+    # removed. Only the windows through the changed cell are rescored.
+    __slots__ = ("table", "center", "center_mask", "cell_windows", "counts", "scores")
+
+    def __init__(self, evaluator, board):
+        game = board.game
+        self.table = evaluator.window_table(game.n)
+        self.center = evaluator.center
+        self.center_mask = game.center_mask
+        self.cell_windows = game.cell_window_indices
+        self.counts = [None, None, None]
+        self.scores = [None, 0, 0]
+        for piece in (PLAYER_PIECE, AI_PIECE):
+            stones = board.pieces(piece)
+            self.counts[piece] = [(stones & window).bit_count() for window in game.windows]
+        for piece in (PLAYER_PIECE, AI_PIECE):
+            self.scores[piece] = evaluator.score_position(board, piece)
+
+    def add(self, cell, piece):
+        # `cell` is the stone's bit position in the board masks
+        table = self.table
+        opp = PLAYER_PIECE + AI_PIECE - piece
+        mine_counts = self.counts[piece]
+        theirs_counts = self.counts[opp]
+        delta = 0
+        opp_delta = 0
+        for n in self.cell_windows[cell]:
+            mine = mine_counts[n]
+            theirs = theirs_counts[n]
+            delta += table[mine+1][theirs] - table[mine][theirs]
+            opp_delta += table[theirs][mine+1] - table[theirs][mine]
+            mine_counts[n] = mine + 1
+        if self.center_mask >> cell & 1:
+            delta += self.center
+        self.scores[piece] += delta
+        self.scores[opp] += opp_delta
+
+    def remove(self, cell, piece):
+        table = self.table
+        opp = PLAYER_PIECE + AI_PIECE - piece
+        mine_counts = self.counts[piece]
+        theirs_counts = self.counts[opp]
+        delta = 0
+        opp_delta = 0
+        for n in self.cell_windows[cell]:
+            mine = mine_counts[n]
+            theirs = theirs_counts[n]
+            delta += table[mine-1][theirs] - table[mine][theirs]
+            opp_delta += table[theirs][mine-1] - table[theirs][mine]
+            mine_counts[n] = mine - 1
+        if self.center_mask >> cell & 1:
+            delta -= self.center
+        self.scores[piece] += delta
+        self.scores[opp] += opp_delta
@@ -1,91 +1,157 @@
-import pygame
-import sys
-import numpy as np
-from backend import *
-
-pygame.init()
-
-SQUARESIZE = 100
-width = COLUMN_COUNT * SQUARESIZE
-height = (ROW_COUNT + 1) * SQUARESIZE
-size = (width, height)
-RADIUS = int(SQUARESIZE/2 - 5)
-
-screen = pygame.display.set_mode(size)
-font = pygame.font.SysFont("monospace", 75)
-
-def draw_board(board, user_color, ai_color):
-    for c in range(COLUMN_COUNT):
-        for r in range(ROW_COUNT):
-            pygame.draw.rect(screen, (0, 0, 255), (c*SQUARESIZE, (r+1)*SQUARESIZE, SQUARESIZE, SQUARESIZE))
-            color = (0, 0, 0)
-            if board[r][c] == PLAYER_PIECE:
-                color = user_color
-            elif board[r][c] == AI_PIECE:
-                color = ai_color
-            pygame.draw.circle(screen, color, (int(c*SQUARESIZE+SQUARESIZE/2), int((r+1)*SQUARESIZE+SQUARESIZE/2)), RADIUS)
-    pygame.display.update()
-
-def main():
-    user_input = input("Choose your color (red/green/yellow): ").lower()
-    color_map = {
-        "red": (255, 0, 0),
-        "green": (0, 255, 0),
-        "yellow": (255, 255, 0)
-    }
-    user_color = color_map.get(user_input, (255, 0, 0))
-    ai_color = (0, 255, 255)
-
-    board = create_board()
-    game_over = False
-    turn = random.randint(PLAYER, AI)
-    draw_board(board, user_color, ai_color)
-
-    while not game_over:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                sys.exit()
-
-            if event.type == pygame.MOUSEMOTION and turn == PLAYER:
-                pygame.draw.rect(screen, (0, 0, 0), (0, 0, width, SQUARESIZE))
-                posx = event.pos[0]
-                pygame.draw.circle(screen, user_color, (posx, int(SQUARESIZE/2)), RADIUS)
-                pygame.display.update()
-
-            if event.type == pygame.MOUSEBUTTONDOWN and turn == PLAYER:
-                pygame.draw.rect(screen, (0, 0, 0), (0, 0, width, SQUARESIZE))
-                col = event.pos[0] // SQUARESIZE
-                if is_valid_location(board, col):
-                    row = get_next_open_row(board, col)
-                    drop_piece(board, row, col, PLAYER_PIECE)
-
-                    if winning_move(board, PLAYER_PIECE):
-                        draw_board(board, user_color, ai_color)
-                        label = font.render("You win!", 1, user_color)
-                        screen.blit(label, (40, 10))
-                        pygame.display.update()
-                        pygame.time.wait(3000)
-                        game_over = True
-                    else:
-                        turn = AI
-                        draw_board(board, user_color, ai_color)
-
-        if turn == AI and not game_over:
-            col, _ = minimax(board, 5, -math.inf, math.inf, True)
-            if is_valid_location(board, col):
-                pygame.time.wait(500)
-                row = get_next_open_row(board, col)
-                drop_piece(board, row, col, AI_PIECE)
-                if winning_move(board, AI_PIECE):
-                    draw_board(board, user_color, ai_color)
-                    label = font.render("AI wins!", 1, ai_color)
-                    screen.blit(label, (40, 10))
-                    pygame.display.update()
-                    pygame.time.wait(3000)
-                    game_over = True
-                else:
-                    draw_board(board, user_color, ai_color)
-                    turn = PLAYER
-
-if __name__ == "__main__":
-    main()
+import pygame
+import sys
+import os
+import random
+from .bitboard import *
+from .evaluation import DEFAULT
+from .records import RecordWriter, DRAW, FLAG_PONDER
+from .render import BoardRenderer
+from .worker import SearchWorker, THINKING
+
+SQUARESIZE = 100
+width = COLUMN_COUNT * SQUARESIZE
+height = (ROW_COUNT + 1) * SQUARESIZE
+size = (width, height)
+RADIUS = int(SQUARESIZE/2 - 5)
+# Milliseconds the AI may think per move
+AI_TIME_BUDGET = 1000
+# Search the AI's answers while the player is thinking
+PONDER = True
+# Every game is appended to this file (see records.py); set
+# CONNF_GAME_RECORDS to another file, or to nothing to keep no records
+GAME_RECORDS = os.environ.get("CONNF_GAME_RECORDS", "games.c4r") or None
+# Search results are kept across games in this file (see cache.py); set
+# CONNF_RESULT_CACHE to another file, or to nothing to start every search cold
+RESULT_CACHE = os.environ.get("CONNF_RESULT_CACHE", "results.c4c") or None
+
+# Created by main(), so the module imports without opening a window
+screen = None
+font = None
+small_font = None
+renderer = None
+
+def init_display():
+    global screen, font, small_font
+    pygame.init()
+    screen = pygame.display.set_mode(size)
+    font = pygame.font.SysFont("monospace", 75)
+    small_font = pygame.font.SysFont("monospace", 25)
+
+def draw_board(board, user_color, ai_color):
+    # Row 0 is drawn at the top; only changed cells are redrawn
+    global renderer
+    if renderer is None:
+        renderer = BoardRenderer(screen, ROW_COUNT, COLUMN_COUNT, SQUARESIZE, RADIUS,
+                                 {PLAYER_PIECE: user_color, AI_PIECE: ai_color}, flip=False)
+    renderer.draw(board)
+
+def draw_thinking(nodes):
+    # Search progress in the right half of the top strip
+    area = (width // 2, 0, width // 2, SQUARESIZE)
+    pygame.draw.rect(screen, (0, 0, 0), area)
+    label = small_font.render("thinking %d" % nodes, 1, (255, 255, 255))
+    screen.blit(label, (width // 2 + 10, SQUARESIZE // 2 - 15))
+    renderer.mark(area)
+
+def main():
+    user_input = input("Choose your color (red/green/yellow): ").lower()
+    color_map = {
+        "red": (255, 0, 0),
+        "green": (0, 255, 0),
+        "yellow": (255, 255, 0)
+    }
+    user_color = color_map.get(user_input, (255, 0, 0))
+    ai_color = (0, 255, 255)
+
+    board = create_board()
+    worker = SearchWorker(DEFAULT, cache_path=RESULT_CACHE)
+    init_display()
+    records = RecordWriter(GAME_RECORDS, "default", AI_TIME_BUDGET, None, FLAG_PONDER if PONDER else 0)
+    clock = pygame.time.Clock()
+    game_over = False
+    turn = random.randint(PLAYER, AI)
+    records.start(PLAYER_PIECE if turn == PLAYER else AI_PIECE)
+    draw_board(board, user_color, ai_color)
+
+    while not game_over:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                worker.close()
+                records.close()
+                sys.exit()
+
+            if event.type == pygame.MOUSEMOTION and turn == PLAYER:
+                renderer.hover(event.pos[0], user_color)
+
+            if event.type == pygame.MOUSEBUTTONDOWN and turn == PLAYER:
+                renderer.clear_strip()
+                col = event.pos[0] // SQUARESIZE
+                if is_valid_location(board, col):
+                    row = get_next_open_row(board, col)
+                    drop_piece(board, row, col, PLAYER_PIECE)
+                    records.move(col)
+
+                    if winning_move(board, PLAYER_PIECE):
+                        records.finish(PLAYER_PIECE)
+                        draw_board(board, user_color, ai_color)
+                        label = font.render("You win!", 1, user_color)
+                        renderer.mark(screen.blit(label, (40, 10)))
+                        renderer.flush()
+                        pygame.time.wait(3000)
+                        game_over = True
+                    elif board.is_full():
+                        records.finish(DRAW)
+                        draw_board(board, user_color, ai_color)
+                        label = font.render("Draw!", 1, (255, 255, 255))
+                        renderer.mark(screen.blit(label, (40, 10)))
+                        renderer.flush()
+                        pygame.time.wait(3000)
+                        game_over = True
+                    else:
+                        turn = AI
+                        draw_board(board, user_color, ai_color)
+
+        if turn == AI and not game_over:
+            if not worker.busy:
+                worker.start(board, AI_TIME_BUDGET)
+            col = worker.poll()
+            if col is THINKING:
+                draw_thinking(worker.nodes)
+            elif is_valid_location(board, col):
+                # The node count goes with the thinking
+                renderer.clear_strip()
+                pygame.time.wait(500)
+                row = get_next_open_row(board, col)
+                drop_piece(board, row, col, AI_PIECE)
+                records.move(col)
+                if winning_move(board, AI_PIECE):
+                    records.finish(AI_PIECE)
+                    draw_board(board, user_color, ai_color)
+                    label = font.render("AI wins!", 1, ai_color)
+                    renderer.mark(screen.blit(label, (40, 10)))
+                    renderer.flush()
+                    pygame.time.wait(3000)
+                    game_over = True
+                elif board.is_full():
+                    records.finish(DRAW)
+                    draw_board(board, user_color, ai_color)
+                    label = font.render("Draw!", 1, (255, 255, 255))
+                    renderer.mark(screen.blit(label, (40, 10)))
+                    renderer.flush()
+                    pygame.time.wait(3000)
+                    game_over = True
+                else:
+                    draw_board(board, user_color, ai_color)
+                    turn = PLAYER
+                    if PONDER:
+                        worker.ponder(board, AI_TIME_BUDGET)
+
+        # One display update per frame, for just the areas drawn on
+        renderer.flush()
+        clock.tick(60)
+
+    worker.close()
+    records.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from .arena import percentiles
+from .bitboard import AI_PIECE, PLAYER_PIECE, create_board
+from .server import GameServer
+
+# Simulated players for connf_ai/server.py. Each client opens its own
+# connection and plays random legal moves, game after game; a move turned
+# away as busy is sent again after a wait that doubles each time.
+
+BUSY_RETRY = 0.01
+BUSY_RETRY_MAX = 0.2
+
+async def _request(reader, writer, message, counts):
+    delay = BUSY_RETRY
+    while True:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        if reply.get("error") != "busy":
+            break
+        counts["busy"] += 1
+        await asyncio.sleep(delay)
+        delay = min(2 * delay, BUSY_RETRY_MAX)
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    return reply
+
+async def client(host, port, games, time_budget, rng, latencies, counts):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(games):
+            board = create_board()
+            first = rng.choice(("player", "ai"))
+            reply = await _request(reader, writer, {"op": "new", "first": first, "time": time_budget}, counts)
+            game = reply["game"]
+            if reply["ai_move"] is not None:
+                board.set_turn(AI_PIECE)
+                board.play(reply["ai_move"])
+            while reply["result"] is None:
+                col = rng.choice([c for c in range(board.game.columns) if board.can_play(c)])
+                # Latency as the player sees it, retries included
+                start = time.perf_counter()
+                reply = await _request(reader, writer, {"op": "move", "game": game, "col": col}, counts)
+                latencies.append(time.perf_counter() - start)
+                board.set_turn(PLAYER_PIECE)
+                board.play(col)
+                if reply["ai_move"] is not None:
+                    board.set_turn(AI_PIECE)
+                    board.play(reply["ai_move"])
+            await _request(reader, writer, {"op": "close", "game": game}, counts)
+            counts["games"] += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def run(clients=16, games=4, time_budget=50, host=None, port=8765, workers=None, max_pending=None, seed=None, cache_path=None):
+    # Without `host` a server is started in this process, on a free port
+    server = None
+    if host is None:
+        server = GameServer(workers, max_pending, cache_path=cache_path)
+        listener = await server.start("127.0.0.1", 0)
+        host, port = listener.sockets[0].getsockname()[:2]
+    rng = random.Random(seed)
+    latencies = []
+    counts = {"games": 0, "busy": 0}
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            client(host, port, games, time_budget, random.Random(rng.getrandbits(32)), latencies, counts)
+            for _ in range(clients)))
+    finally:
+        elapsed = time.perf_counter() - start
+        if server is not None:
+            await server.stop()
+    return {
+        "clients": clients,
+        "games": counts["games"],
+        "seconds": elapsed,
+        "games_per_second": counts["games"] / elapsed if elapsed else 0.0,
+        "moves": len(latencies),
+        "busy": counts["busy"],
+        "latencies": latencies,
+        "cache": None if server is None or server.cache is None else server.cache.stats(),
+    }
+
+def report(result, time_budget):
+    print("%d clients, %d games in %.1f s: %.2f games/s" % (
+        result["clients"], result["games"], result["seconds"], result["games_per_second"]))
+    print("  %d moves at %d ms per AI move, %d turned away as busy" % (result["moves"], time_budget, result["busy"]))
+    print("  %-14s %9s %9s %9s %9s" % ("ms per move", "p50", "p90", "p99", "max"))
+    print("  %-14s %9.2f %9.2f %9.2f %9.2f" % (("latency",) + tuple(percentiles(result["latencies"]))))
+    if result["cache"] is not None:
+        print("  result cache: %(hits)d hits, %(misses)d misses (%(used)d of %(slots)d slots used)" % result["cache"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m connf_ai.loadtest", description="Play many games at once against connf_ai.server.")
+    parser.add_argument("-c", "--clients", type=int, default=16)
+    parser.add_argument("-n", "--games", type=int, default=4, help="games per client")
+    parser.add_argument("-t", "--time", type=int, default=50, help="milliseconds per AI move")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="a running server (default: start one here)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="search processes of the server started here")
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("-s", "--seed", type=int, default=None)
+    parser.add_argument("--cache", metavar="PATH", help="result cache file of the server started here")
+    args = parser.parse_args(argv)
+    host, port = None, None
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        if not host or not port.isdigit():
+            parser.error("--connect takes HOST:PORT")
+        port = int(port)
+    result = asyncio.run(run(args.clients, args.games, args.time, host, port, args.workers, args.max_pending, args.seed, args.cache))
+    report(result, args.time)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from .bitboard import AI_PIECE, PLAYER_PIECE, STANDARD, winning_move, winning_cells, possible
+from .evaluation import DEFAULT
+from .search import QUIESCENCE_NODES, Search, SearchTimeout
+from .transposition import TranspositionTable
+
+# How often the parent checks the deadline and cancellation, in seconds
+POLL_INTERVAL = 0.01
+
+class ParallelSearch:
+    # Splits the root moves across a pool of processes that lives as long as
+    # this object, so start-up is paid once per game. The center move is
+    # searched first; the others then start from its value, and every
+    # finished move raises the shared bound for the ones still to start.
+    # The root follows the serial Search's threat rules: a win on the spot or
+    # a forced block is played as a serial Search would. Other values are
+    # only guaranteed to match a fresh serial Search while the workers'
+    # tables are fresh too. The tables last as long as the pool, and
+    # entries from earlier, deeper searches can then settle a position to
+    # more than the depth asked for, as they do in a reused Search. Among
+    # moves of equal value the first in center-out order is chosen, where
+    # the serial search takes the first in its own move ordering.
+    def __init__(self, evaluator=DEFAULT, workers=None, table_entries=1 << 18):
+        self.evaluator = evaluator
+        self.workers = workers or os.cpu_count() or 1
+        # Best root value so far, from the root player's side
+        self._bound = multiprocessing.Value("d", -math.inf)
+        self._halt = multiprocessing.Value("b", 0, lock=False)
+        self._pool = ProcessPoolExecutor(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(evaluator, table_entries, self._bound, self._halt),
+        )
+        self.stop = None
+        self.progress = None
+        # Optional ResultCache, probed and filled once per root search
+        self.cache = None
+        self.deadline = None
+        self.nodes = 0
+        self.depth = 0
+
+    def close(self):
+        self._halt.value = 1
+        self._pool.shutdown(cancel_futures=True)
+
+    def minimax(self, board, depth, maximizingPlayer=True):
+        result = self._start(board, maximizingPlayer)
+        if result is not None:
+            return result
+        self.depth = depth
+        return self._cached_root(board, depth, maximizingPlayer)
+
+    def iterative_deepening(self, board, time_budget, maximizingPlayer=True, max_depth=None):
+        result = self._start(board, maximizingPlayer)
+        if result is not None:
+            return result
+        empty = board.game.cells - len(board.history)
+        if max_depth is None or max_depth > empty:
+            max_depth = empty
+        deadline = time.perf_counter() + time_budget / 1000
+        best = None
+        for depth in range(1, max_depth + 1):
+            self.deadline = deadline if best is not None else None
+            try:
+                best = self._cached_root(board, depth, maximizingPlayer)
+            except SearchTimeout:
+                break
+            self.depth = depth
+            if abs(best[1]) >= self.evaluator.win or time.perf_counter() >= deadline:
+                break
+        self.deadline = None
+        return best
+
+    def _start(self, board, maximizingPlayer):
+        board.set_turn(AI_PIECE if maximizingPlayer else PLAYER_PIECE)
+        self.nodes = 0
+        self.depth = 0
+        if winning_move(board, AI_PIECE):
+            return (None, self.evaluator.win)
+        if winning_move(board, PLAYER_PIECE):
+            return (None, -self.evaluator.win)
+        if board.is_full():
+            return (None, 0)
+
+    def _cached_root(self, board, depth, maximizingPlayer):
+        if self.cache is None:
+            return self._root(board, depth, maximizingPlayer)
+        result = self.cache.probe(board, depth, self.evaluator, QUIESCENCE_NODES)
+        if result is None:
+            result = self._root(board, depth, maximizingPlayer)
+            self.cache.store(board, depth, self.evaluator, QUIESCENCE_NODES, *result)
+        return result
+
+    def _root(self, board, depth, maximizingPlayer):
+        sign = 1 if maximizingPlayer else -1
+        game = board.game
+        columns = game.columns
+        if game is STANDARD:
+            cells, playable = winning_cells, possible(board.mask)
+        else:
+            cells, playable = game.winning_cells, game.possible(board.mask)
+        # A win on the spot, a block, and moves under a threat left out, as
+        # in Search
+        wins = cells(board.current, board.mask) & playable
+        if wins:
+            return (wins.bit_length() - 1) // game.stride, sign * self.evaluator.win
+        threats = cells(board.current ^ board.mask, board.mask)
+        forced = threats & playable
+        if forced:
+            col = (forced.bit_length() - 1) // game.stride
+            if forced & (forced - 1):
+                return col, -sign * self.evaluator.win
+            moves = [col]
+        else:
+            moves = [col for col in game.center_order if board.can_play(col)]
+            if board.is_symmetric():
+                # Mirror-image moves lead to positions of the same value
+                moves = [col for col in moves if col <= columns // 2]
+            under = (threats >> 1) & playable
+            safe = [col for col in moves if not under & game.column_mask[col]]
+            if safe:
+                moves = safe
+        self._bound.value = -math.inf
+        self._halt.value = 0
+        values = {}
+        # Eldest brother first: its value bounds all the others
+        self._collect([self._pool.submit(_search_move, board, moves[0], depth, maximizingPlayer)], values)
+        self._collect([self._pool.submit(_search_move, board, col, depth, maximizingPlayer) for col in moves[1:]], values)
+        best = max(values[col] * sign for col in moves)
+        for col in moves:
+            if values[col] * sign == best:
+                return col, values[col]
+
+    def _collect(self, futures, values):
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL)
+            for future in done:
+                col, value, nodes = future.result()
+                self.nodes += nodes
+                values[col] = value
+            if self.progress is not None:
+                self.progress.value = self.nodes
+            cancelled = self.stop is not None and self.stop.is_set()
+            if cancelled or (self.deadline is not None and time.perf_counter() > self.deadline):
+                self._halt.value = 1
+                wait(pending)
+                raise SearchTimeout()
+        if any(value is None for value in values.values()):
+            raise SearchTimeout()
+
+_search = None
+_bound = None
+_halt = None
+
+class _Halted:
+    def is_set(self):
+        return _halt.value != 0
+
+def _init_worker(evaluator, table_entries, bound, halt):
+    global _search, _bound, _halt
+    _search = Search(evaluator, TranspositionTable(table_entries))
+    _search.stop = _Halted()
+    _bound = bound
+    _halt = halt
+
+def _search_move(board, col, depth, maximizingPlayer):
+    # Value of playing `col` at the root, exact whenever it is at least the
+    # shared bound; None if the search was halted
+    sign = 1 if maximizingPlayer else -1
+    alpha, beta = -math.inf, math.inf
+    best = _bound.value
+    if best > -math.inf:
+        # One below the bound so a tie still comes back exact
+        if maximizingPlayer:
+            alpha = best - 1
+        else:
+            beta = -best + 1
+    board.play(col)
+    if board.last_move_wins():
+        value = sign * _search.evaluator.win
+        nodes = 1
+    else:
+        try:
+            value = _search.minimax(board, depth - 1, alpha, beta, not maximizingPlayer)[1]
+        except SearchTimeout:
+            return col, None, _search.nodes
+        nodes = _search.nodes
+    with _bound.get_lock():
+        if value * sign > _bound.value:
+            _bound.value = value * sign
+    return col, value, nodes
@@ -0,0 +1,146 @@
+import os
+import struct
+import time
+import numpy as np
+from .bitboard import ROW_COUNT, COLUMN_COUNT, PLAYER_PIECE, AI_PIECE, EMPTY
+
+# A record file is a header followed by fixed-size game records, so games
+# can be indexed and memory-mapped as one NumPy array.
+# magic, format version, rows, columns
+FILE_HEADER = struct.Struct("<4sBBBx")
+RECORD_MAGIC = b"C4GR"
+RECORD_VERSION = 1
+MAX_MOVES = ROW_COUNT * COLUMN_COUNT
+
+# moves played, first piece, result, flags, time budget (ms), depth limit
+# (0 for none), start (Unix time), duration (ms), evaluator preset name,
+# one byte per move holding the column
+GAME_RECORD = struct.Struct("<BBbBHBxII16s%ds" % MAX_MOVES)
+RECORD_DTYPE = np.dtype([
+    ("length", "u1"),
+    ("first", "u1"),
+    ("result", "i1"),
+    ("flags", "u1"),
+    ("time_budget", "<u2"),
+    ("max_depth", "u1"),
+    ("", "V1"),
+    ("started", "<u4"),
+    ("duration", "<u4"),
+    ("evaluator", "S16"),
+    ("moves", "u1", (MAX_MOVES,)),
+])
+
+# Results: the winning piece, or one of these
+DRAW = 0
+UNFINISHED = -1
+
+# Flags
+# The AI played solved moves once the solver could reach the end
+FLAG_SOLVER = 1
+FLAG_PONDER = 2
+
+class RecordWriter:
+    # Appends one record per game to `path`. Call start() when a game
+    # begins, move() for every stone dropped and finish() at the end; the
+    # record is written and flushed by finish(), so a crash loses at most
+    # the game in progress. With `path` None nothing is written, so game
+    # loops can make the calls either way.
+    def __init__(self, path, evaluator="", time_budget=0, max_depth=None, flags=0):
+        self.path = path
+        self.evaluator = evaluator.encode()[:16]
+        self.time_budget = min(time_budget, 0xFFFF)
+        self.max_depth = max_depth or 0
+        self.flags = flags
+        self.moves = None
+        self.file = None
+        if path is None:
+            return
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, ROW_COUNT, COLUMN_COUNT))
+            self.file.flush()
+
+    def start(self, first):
+        self.first = first
+        self.moves = bytearray()
+        self.started = time.time()
+
+    def move(self, col):
+        self.moves.append(col)
+
+    def finish(self, result=UNFINISHED):
+        # `result` is the winning piece or DRAW; a full board without a
+        # winner counts as a draw
+        if self.moves is None or self.file is None:
+            self.moves = None
+            return
+        if result == UNFINISHED and len(self.moves) == MAX_MOVES:
+            result = DRAW
+        duration = int((time.time() - self.started) * 1000)
+        self.file.write(GAME_RECORD.pack(
+            len(self.moves), self.first, result, self.flags, self.time_budget,
+            self.max_depth, int(self.started), duration, self.evaluator, bytes(self.moves)))
+        self.file.flush()
+        self.moves = None
+
+    def close(self):
+        self.finish()
+        if self.file is not None:
+            self.file.close()
+
+def read_records(path):
+    # All games in the file as a read-only memory-mapped structured array
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError("%s is not a game record file" % path)
+    magic, version, rows, columns = FILE_HEADER.unpack(header)
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError("%s is not a game record file" % path)
+    if (rows, columns) != (ROW_COUNT, COLUMN_COUNT):
+        raise ValueError("%s holds %dx%d games" % (path, rows, columns))
+    count = (os.path.getsize(path) - FILE_HEADER.size) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=FILE_HEADER.size, shape=(count,))
+
+def boards_at(records, ply):
+    # Boards after `ply` moves of every game that lasted that long, as an
+    # (N, 6, 7) int8 array with row 0 at the bottom, and the indices of
+    # those games in `records`
+    games = np.flatnonzero(records["length"] >= ply)
+    moves = np.asarray(records["moves"][games], dtype=np.intp)
+    first = np.asarray(records["first"][games], dtype=np.int8)
+    second = PLAYER_PIECE + AI_PIECE - first
+    boards = np.full((len(games), ROW_COUNT, COLUMN_COUNT), EMPTY, dtype=np.int8)
+    heights = np.zeros((len(games), COLUMN_COUNT), dtype=np.intp)
+    index = np.arange(len(games))
+    for k in range(ply):
+        cols = moves[:, k]
+        rows = heights[index, cols]
+        boards[index, rows, cols] = first if k % 2 == 0 else second
+        heights[index, cols] += 1
+    return boards, games
+
+def all_boards(records):
+    # Every position of every game, the empty board included, as an
+    # (N, 6, 7) int8 array, with the game index and ply of each
+    lengths = np.asarray(records["length"], dtype=np.intp)
+    moves = np.asarray(records["moves"], dtype=np.intp)
+    first = np.asarray(records["first"], dtype=np.int8)
+    second = PLAYER_PIECE + AI_PIECE - first
+    boards = np.full((len(records), ROW_COUNT, COLUMN_COUNT), EMPTY, dtype=np.int8)
+    heights = np.zeros((len(records), COLUMN_COUNT), dtype=np.intp)
+    out = [boards.copy()]
+    games = [np.arange(len(records))]
+    plies = [np.zeros(len(records), dtype=np.intp)]
+    for k in range(int(lengths.max(initial=0))):
+        index = np.flatnonzero(lengths > k)
+        cols = moves[index, k]
+        rows = heights[index, cols]
+        boards[index, rows, cols] = (first if k % 2 == 0 else second)[index]
+        heights[index, cols] += 1
+        out.append(boards[index])
+        games.append(index)
+        plies.append(np.full(len(index), k + 1, dtype=np.intp))
+    return np.concatenate(out), np.concatenate(games), np.concatenate(plies)
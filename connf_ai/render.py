@@ -0,0 +1,90 @@
+import pygame
+from .bitboard import EMPTY
+
+class BoardRenderer:
+    # Draws the board by blitting pre-rendered cells and updates only the
+    # parts of the window that changed. Drawing calls collect dirty rects;
+    # flush() hands them to display.update once per frame.
+    #
+    # Row 0 of the board is drawn at the bottom unless `flip` is False.
+    # The strip above the board is where the hovering piece and messages go.
+    def __init__(self, screen, rows, columns, squaresize, radius, colors, flip=True,
+                 board_color=(0, 0, 255), empty_color=(0, 0, 0), strip_color=(0, 0, 0)):
+        self.screen = screen
+        self.rows = rows
+        self.columns = columns
+        self.squaresize = squaresize
+        self.radius = radius
+        self.flip = flip
+        self.strip_color = strip_color
+        self.strip = pygame.Rect(0, 0, columns * squaresize, squaresize)
+        self.sprites = {EMPTY: self._cell(board_color, empty_color)}
+        self.hover_sprites = {}
+        for piece, color in colors.items():
+            self.sprites[piece] = self._cell(board_color, color)
+            self.hover_sprites[color] = self._cell(strip_color, color)
+        self.grid = pygame.Surface((columns * squaresize, rows * squaresize)).convert()
+        for r in range(rows):
+            for c in range(columns):
+                self.grid.blit(self.sprites[EMPTY], (c * squaresize, r * squaresize))
+        self.cells = None
+        self.hover_rect = None
+        self.dirty = []
+
+    def _cell(self, background, color):
+        size = self.squaresize
+        cell = pygame.Surface((size, size)).convert()
+        cell.fill(background)
+        pygame.draw.circle(cell, color, (size // 2, size // 2), self.radius)
+        return cell
+
+    def _cell_rect(self, row, col):
+        y = self.rows - 1 - row if self.flip else row
+        return pygame.Rect(col * self.squaresize, (y + 1) * self.squaresize, self.squaresize, self.squaresize)
+
+    def draw(self, board):
+        # Blits the cells that differ from the last board drawn
+        if self.cells is None:
+            self.clear_strip()
+            self.screen.blit(self.grid, (0, self.squaresize))
+            self.cells = [[EMPTY] * self.columns for _ in range(self.rows)]
+            self.dirty.append(pygame.Rect(0, self.squaresize, self.columns * self.squaresize, self.rows * self.squaresize))
+        for r in range(self.rows):
+            row = board[r]
+            cells = self.cells[r]
+            for c in range(self.columns):
+                piece = row[c]
+                if cells[c] != piece:
+                    cells[c] = piece
+                    rect = self._cell_rect(r, c)
+                    self.screen.blit(self.sprites[piece], rect)
+                    self.dirty.append(rect)
+
+    def redraw(self):
+        # Repaints everything on the next draw(), e.g. after a menu
+        self.cells = None
+        self.hover_rect = None
+
+    def hover(self, x, color):
+        # Piece following the mouse in the top strip
+        if self.hover_rect is not None:
+            self.screen.fill(self.strip_color, self.hover_rect)
+            self.dirty.append(self.hover_rect)
+        rect = pygame.Rect(x - self.squaresize // 2, 0, self.squaresize, self.squaresize).clip(self.strip)
+        self.screen.blit(self.hover_sprites[color], rect, rect.move(self.squaresize // 2 - x, 0))
+        self.dirty.append(rect)
+        self.hover_rect = rect
+
+    def clear_strip(self):
+        self.screen.fill(self.strip_color, self.strip)
+        self.dirty.append(self.strip)
+        self.hover_rect = None
+
+    def mark(self, rect):
+        # Something else was drawn in `rect`
+        self.dirty.append(pygame.Rect(rect))
+
+    def flush(self):
+        if self.dirty:
+            pygame.display.update(self.dirty)
+            self.dirty = []
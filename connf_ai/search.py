@@ -0,0 +1,390 @@
+import math
+import time
+from .bitboard import AI_PIECE, PLAYER_PIECE, STANDARD, get_valid_locations, winning_move, winning_cells, possible
+from .evaluation import DEFAULT, IncrementalScore
+from .stats import TimedBoard, TimedScore, TimedWinningCells, CountedTable
+from .transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+# The clock is read once every this many nodes
+CHECK_INTERVAL = 256
+
+# Most forced moves searched past the depth limit from one leaf
+QUIESCENCE_NODES = 16
+
+# Columns from the center outwards, the order moves are tried in by default
+CENTER_ORDER = STANDARD.center_order
+
+class SearchTimeout(Exception):
+    pass
+
+def minimax(board, depth, alpha, beta, maximizingPlayer, evaluator=DEFAULT, table=None):
+    # The search plays and undoes moves on `board` itself; it is left as it was
+    # found once the call returns. Pass the same `table` on every turn of a
+    # game to reuse what earlier searches found.
+    return Search(evaluator, table).minimax(board, depth, alpha, beta, maximizingPlayer)
+
+def iterative_deepening(board, time_budget, maximizingPlayer=True, evaluator=DEFAULT, table=None, max_depth=None):
+    # Searches depth 1, 2, ... until `time_budget` milliseconds have passed and
+    # returns the move of the deepest search that finished
+    return Search(evaluator, table).iterative_deepening(board, time_budget, maximizingPlayer, max_depth)
+
+class Search:
+    # Keep one Search per game and call it on every AI turn: the table and the
+    # history scores carry over from one move to the next. With `symmetry`
+    # mirror-image positions share table entries, and on a symmetric board
+    # only the center column and those left of it are searched. At the
+    # depth limit the search goes on through forced moves only, up to
+    # `quiescence` of them (0 stops at the limit).
+    def __init__(self, evaluator=DEFAULT, table=None, ordering=True, symmetry=True, quiescence=QUIESCENCE_NODES):
+        self.evaluator = evaluator
+        self.table = table
+        self.ordering = ordering
+        self.symmetry = symmetry
+        self.quiescence = quiescence
+        self.deadline = None
+        # Optional event whose is_set() cancels the search, and shared value
+        # whose .value gets the node count as the search runs
+        self.stop = None
+        self.progress = None
+        # Optional SearchStats, filled in by every search while set
+        self.stats = None
+        # Optional ResultCache shared with other searches and sessions
+        self.cache = None
+        self.nodes = 0
+        self.depth = 0
+        self.root = 0
+        self.pv = []
+        self.follow_pv = False
+        self.killers = []
+        self.score = None
+        self.game = None
+        # Threat detection for the game being searched
+        self.winning_cells = None
+        self.possible = None
+        # Cutoff counts per side, indexed by the cell a move fills
+        self.history = [None, [], []]
+
+    def _start(self, board, maximizingPlayer):
+        board.set_turn(AI_PIECE if maximizingPlayer else PLAYER_PIECE)
+        self.root = len(board.history)
+        game = self.game = board.game
+        if len(self.history[PLAYER_PIECE]) != game.columns * game.stride:
+            self.history = [None, [0] * (game.columns * game.stride), [0] * (game.columns * game.stride)]
+        if game is STANDARD:
+            self.winning_cells, self.possible = winning_cells, possible
+        else:
+            self.winning_cells, self.possible = game.winning_cells, game.possible
+        if self.stats is not None:
+            self.stats.reset(self.root)
+        self.nodes = 0
+        self.depth = 0
+        self.pv = []
+        self.killers = [[None, None] for _ in range(game.cells + 1)]
+        for scores in self.history[1:]:
+            # Halve old scores so recent moves weigh more
+            for i, score in enumerate(scores):
+                scores[i] = score >> 1
+        if winning_move(board, AI_PIECE):
+            return (None, self.evaluator.win)
+        if winning_move(board, PLAYER_PIECE):
+            return (None, -self.evaluator.win)
+        if board.is_full():
+            return (None, 0)
+        self.score = IncrementalScore(self.evaluator, board)
+
+    def minimax(self, board, depth, alpha, beta, maximizingPlayer):
+        result = self._start(board, maximizingPlayer)
+        # Only a full-window result is exact, and only those are cached
+        cache = self.cache if alpha == -math.inf and beta == math.inf else None
+        if result is None:
+            self.depth = depth
+            if cache is not None:
+                result = cache.probe(board, depth, self.evaluator, self.quiescence)
+        if result is None:
+            board, table = self._instrument(board)
+            try:
+                result = self._minimax(board, depth, alpha, beta, maximizingPlayer)
+            except SearchTimeout:
+                while len(board.history) > self.root:
+                    board.undo()
+                raise
+            finally:
+                self.table = table
+            if cache is not None:
+                cache.store(board, depth, self.evaluator, self.quiescence, *result)
+            if self.stats is not None:
+                self.stats.iteration(depth, self.nodes)
+        if self.stats is not None:
+            self.stats.finish(result, self.nodes, self.depth)
+        return result
+
+    def iterative_deepening(self, board, time_budget, maximizingPlayer=True, max_depth=None):
+        result = self._start(board, maximizingPlayer)
+        if result is not None:
+            if self.stats is not None:
+                self.stats.finish(result, 0, 0)
+            return result
+        if self.table is None:
+            self.table = TranspositionTable(1 << 16)
+        empty = self.game.cells - len(board.history)
+        if max_depth is None or max_depth > empty:
+            max_depth = empty
+
+        deadline = time.perf_counter() + time_budget / 1000
+        best = None
+        board, table = self._instrument(board)
+        for depth in range(1, max_depth + 1):
+            # Depth 1 always finishes so there is a move to return, unless
+            # the search is cancelled
+            self.deadline = deadline if best is not None else None
+            self.follow_pv = True
+            result = None if self.cache is None else self.cache.probe(board, depth, self.evaluator, self.quiescence)
+            if result is not None:
+                # Found by an earlier search; the next depth starts from its move
+                self.pv = [result[0]]
+            else:
+                try:
+                    result = self._minimax(board, depth, -math.inf, math.inf, maximizingPlayer)
+                except SearchTimeout:
+                    while len(board.history) > self.root:
+                        board.undo()
+                    break
+                self.pv = self.principal_variation(board, depth)
+                if self.cache is not None:
+                    self.cache.store(board, depth, self.evaluator, self.quiescence, *result)
+            best = result
+            self.depth = depth
+            if self.stats is not None:
+                self.stats.iteration(depth, self.nodes)
+            if abs(result[1]) >= self.evaluator.win or time.perf_counter() >= deadline:
+                break
+        self.deadline = None
+        self.table = table
+        if self.stats is not None:
+            self.stats.finish(best, self.nodes, self.depth)
+        return best
+
+    def _instrument(self, board):
+        # With stats on, the search runs on wrappers that count and time the
+        # table probes, win checks (threat detection included) and
+        # evaluation. Returns the board to search and the table to put back
+        # afterwards.
+        table = self.table
+        if self.stats is not None:
+            board = TimedBoard(board, self.stats)
+            self.score = TimedScore(self.score, self.stats)
+            self.winning_cells = TimedWinningCells(self.winning_cells, self.stats)
+            if table is not None:
+                self.table = CountedTable(table, self.stats)
+        return board, table
+
+    def principal_variation(self, board, depth):
+        # Follows the best moves stored in the table from the current position
+        pv = []
+        while len(pv) < depth:
+            key, mirrored = self._key(board)
+            entry = self.table.probe(key)
+            if entry is None or entry[3] is None:
+                break
+            col = self.game.columns - 1 - entry[3] if mirrored else entry[3]
+            if not board.can_play(col):
+                break
+            board.play(col)
+            pv.append(col)
+            if board.last_move_wins():
+                break
+        for _ in pv:
+            board.undo()
+        return pv
+
+    def _key(self, board):
+        # Table key and whether the moves stored under it are mirrored
+        if self.symmetry:
+            return board.canonical_key()
+        return board.key(), False
+
+    def _poll(self):
+        if self.progress is not None:
+            self.progress.value = self.nodes
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout()
+
+    def _order_moves(self, board, ply, first):
+        if not self.ordering:
+            moves = get_valid_locations(board)
+            if first is not None:
+                moves.remove(first)
+                moves.insert(0, first)
+            return moves
+        # The principal variation or table move, then this ply's killer moves,
+        # then by history score; ties keep the center-out order
+        game = self.game
+        heights = board.heights
+        rows = game.rows
+        stride = game.stride
+        moves = [col for col in game.center_order if heights[col] < rows]
+        killers = self.killers[ply]
+        history = self.history[board.piece]
+        moves.sort(key=lambda col: (col != first, col not in killers, -history[col * stride + heights[col]]))
+        return moves
+
+    def _cutoff(self, board, col, ply, depth):
+        killers = self.killers[ply]
+        if killers[0] != col:
+            killers[1] = killers[0]
+            killers[0] = col
+        self.history[board.piece][col * self.game.stride + board.heights[col]] += depth * depth
+
+    def _quiesce(self, board, maximizingPlayer, budget):
+        # Past the depth limit: a win on the spot, two threats the side to
+        # move cannot both block, or the block of a single threat, followed
+        # for at most `budget` more moves; anything else is scored as it is
+        current, mask = board.current, board.mask
+        if mask == self.game.board_mask:
+            return 0
+        playable = self.possible(mask)
+        win = self.evaluator.win
+        if self.winning_cells(current, mask) & playable:
+            return win if maximizingPlayer else -win
+        forced = self.winning_cells(current ^ mask, mask) & playable
+        if forced & (forced - 1):
+            return -win if maximizingPlayer else win
+        if not forced or not budget:
+            return self.score.scores[AI_PIECE]
+        self.nodes += 1
+        if not self.nodes % CHECK_INTERVAL:
+            self._poll()
+        if self.stats is not None:
+            self.stats.quiescence_nodes += 1
+        col = (forced.bit_length() - 1) // self.game.stride
+        cell = col * self.game.stride + board.heights[col]
+        piece = board.piece
+        score = self.score
+        board.play(col)
+        score.add(cell, piece)
+        value = self._quiesce(board, not maximizingPlayer, budget - 1)
+        score.remove(cell, piece)
+        board.undo()
+        return value
+
+    def _minimax(self, board, depth, alpha, beta, maximizingPlayer):
+        self.nodes += 1
+        if not self.nodes % CHECK_INTERVAL:
+            self._poll()
+        game = self.game
+        # Nobody has won yet: a win is detected right after the move that makes it
+        if board.mask == game.board_mask:
+            return (None, 0)
+        if depth == 0:
+            if self.quiescence:
+                return (None, self._quiesce(board, maximizingPlayer, self.quiescence))
+            return (None, self.score.scores[AI_PIECE])
+
+        table = self.table
+        first = None
+        if table is not None:
+            key, mirrored = self._key(board)
+            entry = table.probe(key)
+            if entry is not None:
+                _, flag, value, move = entry
+                if mirrored and move is not None:
+                    move = game.columns - 1 - move
+                if self.stats is not None and table.stored_mirrored(key) != mirrored:
+                    self.stats.mirror_hits += 1
+                first = move
+                if entry[0] >= depth:
+                    if flag == EXACT:
+                        return move, value
+                    if flag == LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if alpha >= beta:
+                        return move, value
+        alpha_orig, beta_orig = alpha, beta
+
+        ply = len(board.history) - self.root
+        if self.follow_pv:
+            # Down the previous iteration's principal variation, try its move first
+            if ply < len(self.pv) and board.can_play(self.pv[ply]):
+                first = self.pv[ply]
+            else:
+                self.follow_pv = False
+        if first is not None and not board.can_play(first):
+            first = None
+
+        win = self.evaluator.win
+        # Threats: cells either side would win on right now
+        current, mask = board.current, board.mask
+        playable = self.possible(mask)
+        wins = self.winning_cells(current, mask) & playable
+        if wins:
+            if self.stats is not None:
+                self.stats.immediate_wins += 1
+            return (wins.bit_length() - 1) // game.stride, win if maximizingPlayer else -win
+        threats = self.winning_cells(current ^ mask, mask)
+        forced = threats & playable
+        if forced:
+            col = (forced.bit_length() - 1) // game.stride
+            if self.stats is not None:
+                self.stats.forced_moves += 1
+            if forced & (forced - 1):
+                # Two threats to block: the other one wins whatever we play
+                return col, -win if maximizingPlayer else win
+            moves = [col]
+        else:
+            moves = self._order_moves(board, ply, first)
+            if not ply and self.symmetry and board.is_symmetric():
+                # Mirror-image moves lead to positions of the same value
+                moves = [col for col in moves if col <= game.columns // 2]
+            under = (threats >> 1) & playable
+            if under:
+                # Playing under a threat lets the opponent win on top of it;
+                # unless every move does, leave those out
+                column_mask = game.column_mask
+                safe = [col for col in moves if not under & column_mask[col]]
+                if safe:
+                    moves = safe
+        best_col = moves[0]
+        value = -math.inf if maximizingPlayer else math.inf
+        score = self.score
+        piece = board.piece
+        stride = game.stride
+        for col in moves:
+            cell = col * stride + board.heights[col]
+            board.play(col)
+            if board.last_move_wins():
+                new_score = win if maximizingPlayer else -win
+            else:
+                score.add(cell, piece)
+                new_score = self._minimax(board, depth-1, alpha, beta, not maximizingPlayer)[1]
+                score.remove(cell, piece)
+            board.undo()
+            self.follow_pv = False
+            if maximizingPlayer:
+                if new_score > value:
+                    value = new_score
+                    best_col = col
+                alpha = max(alpha, value)
+            else:
+                if new_score < value:
+                    value = new_score
+                    best_col = col
+                beta = min(beta, value)
+            if alpha >= beta:
+                self._cutoff(board, col, ply, depth)
+                if self.stats is not None:
+                    self.stats.cutoff(col == moves[0])
+                break
+
+        if table is not None:
+            if value <= alpha_orig:
+                flag = UPPER
+            elif value >= beta_orig:
+                flag = LOWER
+            else:
+                flag = EXACT
+            table.store(key, depth, flag, value, game.columns - 1 - best_col if mirrored else best_col, mirrored)
+        return best_col, value
@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .bitboard import AI_PIECE, PLAYER_PIECE, create_board
+from .cache import ResultCache
+from .evaluation import PRESETS
+from .search import Search
+from .transposition import TranspositionTable
+
+# Headless server hosting many games at once. Clients speak one JSON object
+# per line over TCP (or a Unix socket):
+#
+#   {"op": "new", "first": "player"|"ai", "evaluator": "default", "time": MS, "depth": D}
+#       -> {"game": G, "ai_move": C|null, "result": null}
+#   {"op": "move", "game": G, "col": C, "time": MS}
+#       -> {"ai_move": C|null, "result": null|"player"|"ai"|"draw"}
+#   {"op": "close", "game": G}
+#       -> {}
+#
+# "time" and "depth" are optional: a game keeps the budget it was created
+# with, and a move may ask for another one. Errors come back as {"error":
+# "..."}. "busy" means too many searches are waiting; the move was not
+# played and can be sent again.
+
+DEFAULT_TIME_BUDGET = 200
+MAX_TIME_BUDGET = 5000
+
+class Session:
+    # One game: the board and what the AI was asked to play with
+    __slots__ = ("board", "evaluator", "time_budget", "max_depth", "result", "busy")
+
+    def __init__(self, evaluator, time_budget, max_depth):
+        self.board = create_board()
+        self.evaluator = evaluator
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.result = None
+        self.busy = False
+
+class RequestError(Exception):
+    pass
+
+class GameServer:
+    # Every game shares one pool of search processes. At most `workers`
+    # searches run at a time so a move's time budget is spent searching,
+    # not waiting in the pool; the rest wait here, and past `max_pending`
+    # of those new moves are turned away as busy. With `cache_path` every
+    # process shares one ResultCache file.
+    def __init__(self, workers=None, max_pending=None, time_budget=DEFAULT_TIME_BUDGET, table_entries=1 << 18, cache_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending if max_pending is not None else 4 * self.workers
+        self.time_budget = time_budget
+        # Opened here first so the file exists before the processes map it
+        self.cache = None if cache_path is None else ResultCache(cache_path)
+        # Forked processes would inherit the open connections and keep them
+        # from closing, so they are spawned
+        self.pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"), _init_worker, (table_entries, cache_path))
+        self.slots = asyncio.Semaphore(self.workers)
+        self.pending = 0
+        self.games = {}
+        self.ids = itertools.count(1)
+        self.listener = None
+        # Tasks serving the open connections
+        self.handlers = set()
+        # Counters the load test reports
+        self.searches = 0
+        self.rejected = 0
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        if path is not None:
+            self.listener = await asyncio.start_unix_server(self.handle, path)
+        else:
+            self.listener = await asyncio.start_server(self.handle, host, port)
+        return self.listener
+
+    async def stop(self):
+        # Stops listening, lets the open connections finish, then closes
+        self.listener.close()
+        await self.listener.wait_closed()
+        if self.handlers:
+            await asyncio.wait(self.handlers)
+        self.close()
+
+    async def handle(self, reader, writer):
+        # Requests on one connection are answered in order; games created
+        # on it end with it
+        owned = set()
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.request(json.loads(line), owned)
+                except (RequestError, ValueError, TypeError) as e:
+                    reply = {"error": str(e)}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game in owned:
+                self.games.pop(game, None)
+            self.handlers.discard(task)
+            writer.close()
+
+    async def request(self, message, owned):
+        if not isinstance(message, dict):
+            raise RequestError("requests are JSON objects")
+        op = message.get("op")
+        if op == "new":
+            return await self.new_game(message, owned)
+        if op == "move":
+            return await self.move(self._session(message), message)
+        if op == "close":
+            game = message.get("game")
+            self._session(message)
+            del self.games[game]
+            owned.discard(game)
+            return {}
+        raise RequestError("unknown op %r" % op)
+
+    def _session(self, message):
+        session = self.games.get(message.get("game"))
+        if session is None:
+            raise RequestError("no such game")
+        if session.busy:
+            raise RequestError("game busy")
+        return session
+
+    def _time_budget(self, message, default):
+        time_budget = message.get("time", default)
+        # JSON allows NaN and Infinity, and a deadline of NaN never passes
+        if isinstance(time_budget, bool) or not isinstance(time_budget, (int, float)) or not math.isfinite(time_budget) or time_budget <= 0:
+            raise RequestError("bad time budget")
+        return min(time_budget, MAX_TIME_BUDGET)
+
+    async def new_game(self, message, owned):
+        evaluator = message.get("evaluator", "default")
+        if evaluator not in PRESETS:
+            raise RequestError("evaluators are %s" % ", ".join(PRESETS))
+        first = message.get("first", "player")
+        if first not in ("player", "ai"):
+            raise RequestError("first must be player or ai")
+        max_depth = message.get("depth")
+        if max_depth is not None and (isinstance(max_depth, bool) or not isinstance(max_depth, int) or max_depth < 1):
+            raise RequestError("bad depth")
+        session = Session(evaluator, self._time_budget(message, self.time_budget), max_depth)
+        col = None
+        if first == "ai":
+            self._admit()
+            col = await self._ai_move(session, session.time_budget)
+        game = next(self.ids)
+        self.games[game] = session
+        owned.add(game)
+        return {"game": game, "ai_move": col, "result": session.result}
+
+    async def move(self, session, message):
+        board = session.board
+        col = message.get("col")
+        if session.result is not None:
+            raise RequestError("game over")
+        if not isinstance(col, int) or not 0 <= col < board.game.columns or not board.can_play(col):
+            raise RequestError("illegal move")
+        time_budget = self._time_budget(message, session.time_budget)
+        # Turned away before the move is played, so it can be sent again
+        self._admit()
+        board.set_turn(PLAYER_PIECE)
+        board.play(col)
+        if board.last_move_wins():
+            session.result = "player"
+        elif board.is_full():
+            session.result = "draw"
+        reply = None
+        if session.result is None:
+            reply = await self._ai_move(session, time_budget)
+        return {"ai_move": reply, "result": session.result}
+
+    def _admit(self):
+        if self.pending >= self.max_pending + self.workers:
+            self.rejected += 1
+            raise RequestError("busy")
+
+    async def _ai_move(self, session, time_budget):
+        board = session.board
+        session.busy = True
+        self.pending += 1
+        try:
+            async with self.slots:
+                loop = asyncio.get_running_loop()
+                col = await loop.run_in_executor(self.pool, _search, board, session.evaluator, time_budget, session.max_depth)
+        finally:
+            self.pending -= 1
+            session.busy = False
+        self.searches += 1
+        board.set_turn(AI_PIECE)
+        board.play(col)
+        if board.last_move_wins():
+            session.result = "ai"
+        elif board.is_full():
+            session.result = "draw"
+        return col
+
+def _init_worker(table_entries, cache_path):
+    global _searches, _table_entries, _cache
+    # Evaluator name -> the Search this process keeps for it; positions
+    # repeat across games, so the tables stay useful
+    _searches = {}
+    _table_entries = table_entries
+    _cache = None if cache_path is None else ResultCache(cache_path)
+
+def _search(board, evaluator, time_budget, max_depth):
+    search = _searches.get(evaluator)
+    if search is None:
+        search = _searches[evaluator] = Search(PRESETS[evaluator], TranspositionTable(_table_entries))
+        search.cache = _cache
+    return search.iterative_deepening(board, time_budget, True, max_depth)[0]
+
+async def serve(server, host, port, path=None):
+    listener = await server.start(host, port, path)
+    print("serving on %s" % (path or "%s:%d" % (host, port)))
+    async with listener:
+        await listener.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m connf_ai.server", description="Host games over a JSON line protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="search processes (default: one per core)")
+    parser.add_argument("--max-pending", type=int, default=None, help="searches allowed to wait for a process")
+    parser.add_argument("-t", "--time", type=int, default=DEFAULT_TIME_BUDGET, help="default milliseconds per AI move")
+    parser.add_argument("--cache", metavar="PATH", help="share search results across games through this file")
+    args = parser.parse_args(argv)
+    server = GameServer(args.workers, args.max_pending, args.time, cache_path=args.cache)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from .bitboard import AI_PIECE, ROW_COUNT, COLUMN_COUNT, COLUMN_MASK, possible, winning_cells, mirror
+from .transposition import TranspositionTable, UPPER
+from .search import CENTER_ORDER
+
+# Scores follow the usual solver convention: a win with the side to move's
+# n-th stone from the end scores n, a loss scores -n, a draw scores 0.
+CELLS = ROW_COUNT * COLUMN_COUNT
+
+class SolverLimit(Exception):
+    pass
+
+class Solver:
+    # Exact negamax over (current, mask) pairs with null-window probes.
+    # Mirrored positions share table entries.
+    def __init__(self, table=None, node_limit=None):
+        self.table = table if table is not None else TranspositionTable(1 << 20)
+        self.node_limit = node_limit
+        self.nodes = 0
+
+    def solve(self, current, mask, weak=False):
+        # Score of the position for the side to move; with `weak` only the
+        # sign is exact
+        moves = mask.bit_count()
+        if winning_cells(current, mask) & possible(mask):
+            return (CELLS + 1 - moves) // 2
+        low = -((CELLS - moves) // 2)
+        high = (CELLS + 1 - moves) // 2
+        if weak:
+            low, high = -1, 1
+        while low < high:
+            # Probe near zero first: most positions are settled by sign
+            med = low + (high - low) // 2
+            if med <= 0 and int(low / 2) < med:
+                med = int(low / 2)
+            elif med >= 0 and int(high / 2) > med:
+                med = int(high / 2)
+            r = self._negamax(current, mask, med, med + 1, moves)
+            if r <= med:
+                high = r
+            else:
+                low = r
+        return low
+
+    def analyze(self, current, mask, weak=False):
+        # Score of every column for the side to move, None where full
+        scores = [None] * COLUMN_COUNT
+        moves = possible(mask)
+        wins = winning_cells(current, mask)
+        symmetric = _symmetric(current, mask)
+        for col in range(COLUMN_COUNT):
+            move = moves & COLUMN_MASK[col]
+            if not move:
+                continue
+            if symmetric and col > COLUMN_COUNT // 2:
+                scores[col] = scores[COLUMN_COUNT - 1 - col]
+            elif wins & move:
+                scores[col] = (CELLS + 1 - mask.bit_count()) // 2
+            else:
+                scores[col] = -self.solve(current ^ mask, mask | move, weak)
+        return scores
+
+    def _key(self, current, mask):
+        key = current + mask
+        return min(key, mirror(key))
+
+    def _negamax(self, current, mask, alpha, beta, moves):
+        # The side to move has no immediate win here
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SolverLimit()
+        playable = possible(mask)
+        opp_wins = winning_cells(current ^ mask, mask)
+        forced = playable & opp_wins
+        if forced:
+            if forced & (forced - 1):
+                # Two threats to block at once
+                return -((CELLS - moves) // 2)
+            playable = forced
+        # Never play right under an opponent's winning cell
+        playable &= ~(opp_wins >> 1)
+        if not playable:
+            return -((CELLS - moves) // 2)
+        if moves >= CELLS - 2:
+            return 0
+
+        low = -((CELLS - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (CELLS - 1 - moves) // 2
+        key = self._key(current, mask)
+        entry = self.table.probe(key)
+        if entry is not None:
+            high = entry[2]
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # Moves creating the most winning cells first, center-out on ties
+        children = []
+        for col in CENTER_ORDER:
+            move = playable & COLUMN_MASK[col]
+            if move:
+                threats = winning_cells(current | move, mask | move).bit_count()
+                children.append((threats, move))
+        children.sort(key=lambda child: -child[0])
+
+        for _, move in children:
+            score = -self._negamax(current ^ mask, mask | move, -beta, -alpha, moves + 1)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        self.table.store(key, 0, UPPER, alpha, None)
+        return alpha
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+# magic, format version, plies covered, number of positions
+BOOK_HEADER = struct.Struct("<4sBBxxI")
+BOOK_MAGIC = b"C4BK"
+BOOK_VERSION = 1
+
+class OpeningBook:
+    # Solved scores of every position up to `plies` stones, mirror-reduced.
+    # The file is a header, then the sorted position keys as uint64, then one
+    # int8 score per key. It is read on the first lookup.
+    def __init__(self, path=BOOK_PATH):
+        self.path = path
+        self.plies = -1
+        self.keys = None
+        self.scores = None
+
+    def _load(self):
+        self.keys = array("Q")
+        self.scores = array("b")
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            magic, version, plies, count = BOOK_HEADER.unpack(f.read(BOOK_HEADER.size))
+            if magic != BOOK_MAGIC or version != BOOK_VERSION:
+                raise ValueError("%s is not an opening book" % self.path)
+            self.keys.fromfile(f, count)
+            self.scores.fromfile(f, count)
+        self.plies = plies
+
+    def covers(self, stones):
+        if self.keys is None:
+            self._load()
+        return stones <= self.plies
+
+    def get(self, current, mask):
+        if self.keys is None:
+            self._load()
+        if mask.bit_count() > self.plies:
+            return None
+        key = current + mask
+        key = min(key, mirror(key))
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.scores[i]
+        return None
+
+def build_book(plies, path=BOOK_PATH, solver=None):
+    # Solves every position reachable in `plies` moves that is not already
+    # decided. Expect this to run for a very long time at small ply counts.
+    solver = solver if solver is not None else Solver()
+    book = {}
+    level = {(0, 0)}
+    for ply in range(plies + 1):
+        following = set()
+        for current, mask in level:
+            key = current + mask
+            key = min(key, mirror(key))
+            if key in book:
+                continue
+            book[key] = solver.solve(current, mask)
+            if ply == plies or winning_cells(current, mask) & possible(mask):
+                continue
+            moves = possible(mask)
+            for col in range(COLUMN_COUNT):
+                move = moves & COLUMN_MASK[col]
+                if move:
+                    following.add((current ^ mask, mask | move))
+        level = following
+    keys = sorted(book)
+    with open(path, "wb") as f:
+        f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, plies, len(keys)))
+        array("Q", keys).tofile(f)
+        array("b", [book[key] for key in keys]).tofile(f)
+    return len(keys)
+
+def _symmetric(current, mask):
+    # Mirror-image moves of a symmetric position have the same score
+    return mirror(mask) == mask and mirror(current) == current
+
+# Fewest stones at which the solver is tried without the opening book; with
+# fewer it rarely finishes within its node limit
+SOLVE_FROM = 20
+
+class PerfectPlayer:
+    # Plays solved moves for the AI. Keep one per game: the solver's table
+    # carries over between moves. `node_limit` bounds each move's work;
+    # move() returns None when a position could not be solved within it, or
+    # has fewer than `solve_from` stones and is not in the book. No book
+    # ships, so its play is exact only from `solve_from` stones on; before
+    # that the caller's search plays.
+    def __init__(self, node_limit=50000, book=None, solve_from=SOLVE_FROM):
+        self.solver = Solver(node_limit=node_limit)
+        self.book = book if book is not None else OpeningBook()
+        self.solve_from = solve_from
+
+    def move(self, board, piece=AI_PIECE):
+        board.set_turn(piece)
+        current, mask = board.current, board.mask
+        stones = mask.bit_count()
+        if stones < self.solve_from and not self.book.covers(stones + 1):
+            return None
+        self.solver.nodes = 0
+        best_col, best_score = None, None
+        moves = possible(mask)
+        wins = winning_cells(current, mask)
+        symmetric = _symmetric(current, mask)
+        for col in CENTER_ORDER:
+            move = moves & COLUMN_MASK[col]
+            if not move or symmetric and col > COLUMN_COUNT // 2:
+                continue
+            if wins & move:
+                return col
+            child_current, child_mask = current ^ mask, mask | move
+            score = self.book.get(child_current, child_mask)
+            if score is None:
+                try:
+                    score = self.solver.solve(child_current, child_mask)
+                except SolverLimit:
+                    return None
+            if best_score is None or -score > best_score:
+                best_col, best_score = col, -score
+        return best_col
+
+if __name__ == "__main__":
+    # python -m connf_ai.solver PLIES [PATH]
+    count = build_book(int(sys.argv[1]), *sys.argv[2:3])
+    print("%d positions" % count)
@@ -0,0 +1,160 @@
+import json
+import time
+
+class SearchStats:
+    # Collects what one search did. Set `search.stats = SearchStats()` to turn
+    # it on: the search then runs through the timing wrappers below, and
+    # with stats left at None it runs exactly as before. Counters restart
+    # with every search; record() gives them as a dict for logging.
+    def __init__(self):
+        self.reset()
+
+    def reset(self, plies=0):
+        self.plies = plies
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        # (depth, nodes, seconds, finished) for each iteration
+        self.iterations = []
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # Nodes settled by a win on the spot, and nodes with a forced block
+        self.immediate_wins = 0
+        self.forced_moves = 0
+        # Forced moves searched past the depth limit
+        self.quiescence_nodes = 0
+        self.table_probes = 0
+        self.table_hits = 0
+        # Hits on entries stored from the other orientation, which only
+        # symmetry could have found
+        self.mirror_hits = 0
+        self.evals = 0
+        self.eval_seconds = 0.0
+        self.win_checks = 0
+        self.win_seconds = 0.0
+        self.move = None
+        self.value = None
+        self.depth = 0
+
+    def iteration(self, depth, nodes, finished=True):
+        seconds = time.perf_counter() - self.started
+        done_nodes = sum(it[1] for it in self.iterations)
+        done_seconds = sum(it[2] for it in self.iterations)
+        self.iterations.append((depth, nodes - done_nodes, seconds - done_seconds, finished))
+
+    def finish(self, result, nodes, depth):
+        if nodes > sum(it[1] for it in self.iterations):
+            # The iteration cut short by the clock
+            self.iteration(depth + 1, nodes, False)
+        self.seconds = time.perf_counter() - self.started
+        self.nodes = nodes
+        self.depth = depth
+        if result is not None:
+            self.move, self.value = result
+
+    def cutoff(self, first):
+        self.cutoffs += 1
+        if first:
+            self.first_move_cutoffs += 1
+
+    def record(self):
+        value = self.value
+        if value is not None and abs(value) == float("inf"):
+            value = None
+        return {
+            "plies": self.plies,
+            "move": self.move,
+            "value": value,
+            "depth": self.depth,
+            "seconds": self.seconds,
+            "nodes": self.nodes,
+            "nodes_per_depth": [{"depth": d, "nodes": n, "seconds": s, "finished": f} for d, n, s, f in self.iterations],
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoffs / self.cutoffs if self.cutoffs else None,
+            "immediate_wins": self.immediate_wins,
+            "forced_moves": self.forced_moves,
+            "quiescence_nodes": self.quiescence_nodes,
+            "table_probes": self.table_probes,
+            "table_hits": self.table_hits,
+            "mirror_hits": self.mirror_hits,
+            "evals": self.evals,
+            "eval_seconds": self.eval_seconds,
+            "win_checks": self.win_checks,
+            "win_seconds": self.win_seconds,
+        }
+
+def append_jsonl(path, record):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+class TimedBoard:
+    # Stands in for the board during an instrumented search and times the
+    # win checks; everything else goes straight to the real board
+    def __init__(self, board, stats):
+        self._board = board
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._board, name)
+
+    def last_move_wins(self):
+        stats = self._stats
+        start = time.perf_counter()
+        won = self._board.last_move_wins()
+        stats.win_seconds += time.perf_counter() - start
+        stats.win_checks += 1
+        return won
+
+class TimedWinningCells:
+    # Stands in for winning_cells(): the threat detection is win checking
+    # too, and is counted and timed with last_move_wins
+    def __init__(self, winning_cells, stats):
+        self._winning_cells = winning_cells
+        self._stats = stats
+
+    def __call__(self, stones, mask):
+        stats = self._stats
+        start = time.perf_counter()
+        cells = self._winning_cells(stones, mask)
+        stats.win_seconds += time.perf_counter() - start
+        stats.win_checks += 1
+        return cells
+
+class TimedScore:
+    # IncrementalScore wrapper: every read of `scores` is a leaf evaluation,
+    # and add/remove are where the evaluation work is done
+    def __init__(self, score, stats):
+        self._score = score
+        self._stats = stats
+
+    @property
+    def scores(self):
+        self._stats.evals += 1
+        return self._score.scores
+
+    def add(self, cell, piece):
+        start = time.perf_counter()
+        self._score.add(cell, piece)
+        self._stats.eval_seconds += time.perf_counter() - start
+
+    def remove(self, cell, piece):
+        start = time.perf_counter()
+        self._score.remove(cell, piece)
+        self._stats.eval_seconds += time.perf_counter() - start
+
+class CountedTable:
+    # Transposition table wrapper counting probes and hits
+    def __init__(self, table, stats):
+        self._table = table
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._table, name)
+
+    def probe(self, key):
+        entry = self._table.probe(key)
+        self._stats.table_probes += 1
+        if entry is not None:
+            self._stats.table_hits += 1
+        return entry
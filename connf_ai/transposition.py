@@ -0,0 +1,80 @@
+from array import array
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+# Set in an entry's flag when the position was stored as the mirror image
+# of the board its key stands for
+MIRRORED = 4
+
+# Keys of boards larger than 6x7 can need more than the 63 bits an entry
+# holds; those are hashed down, so two positions may then share a key
+KEY_LIMIT = 1 << 63
+
+class TranspositionTable:
+    # Fixed-size table in flat typed arrays, so memory is set by `entries`
+    # (about 19 bytes each) no matter how long the session runs. Entries come
+    # in pairs per bucket: the first slot keeps the deepest search seen, the
+    # second always takes the newest one.
+    def __init__(self, entries=1 << 20):
+        buckets = max(1, entries // 2)
+        if buckets > 1 and buckets % 2 == 0:
+            # An odd bucket count spreads keys whose low bits repeat
+            buckets -= 1
+        self.buckets = buckets
+        size = 2 * buckets
+        self.keys = array("q", [0]) * size
+        self.values = array("q", [0]) * size
+        self.depths = array("b", [-1]) * size
+        self.flags = array("b", [0]) * size
+        self.moves = array("b", [-1]) * size
+
+    def clear(self):
+        size = 2 * self.buckets
+        self.depths = array("b", [-1]) * size
+
+    def _slot(self, key):
+        i = 2 * (key % self.buckets)
+        if self.depths[i] >= 0 and self.keys[i] == key:
+            return i
+        if self.depths[i+1] >= 0 and self.keys[i+1] == key:
+            return i + 1
+        return -1
+
+    def probe(self, key):
+        if key >= KEY_LIMIT:
+            key = hash(key)
+        i = self._slot(key)
+        if i < 0:
+            return None
+        move = self.moves[i]
+        return self.depths[i], self.flags[i] & ~MIRRORED, self.values[i], (None if move < 0 else move)
+
+    def stored_mirrored(self, key):
+        # Whether the entry under `key` came from the mirrored orientation
+        if key >= KEY_LIMIT:
+            key = hash(key)
+        i = self._slot(key)
+        return i >= 0 and self.flags[i] & MIRRORED != 0
+
+    def store(self, key, depth, flag, value, move, mirrored=False):
+        if key >= KEY_LIMIT:
+            key = hash(key)
+        i = 2 * (key % self.buckets)
+        if self.keys[i] != key and depth < self.depths[i]:
+            i += 1
+        elif self.keys[i] != key and self.depths[i] >= 0:
+            # Demote the shallower entry to the always-replace slot
+            self._copy(i, i + 1)
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.flags[i] = flag | MIRRORED if mirrored else flag
+        self.values[i] = value
+        self.moves[i] = -1 if move is None else move
+
+    def _copy(self, src, dst):
+        self.keys[dst] = self.keys[src]
+        self.depths[dst] = self.depths[src]
+        self.flags[dst] = self.flags[src]
+        self.values[dst] = self.values[src]
+        self.moves[dst] = self.moves[src]
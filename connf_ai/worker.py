@@ -0,0 +1,182 @@
+import multiprocessing
+from .bitboard import AI_PIECE, PLAYER_PIECE, STANDARD
+from .cache import ResultCache
+from .evaluation import DEFAULT
+from .parallel import ParallelSearch
+from .search import Search
+from .solver import PerfectPlayer
+from .stats import SearchStats, append_jsonl
+from .transposition import TranspositionTable
+
+# What poll() returns while the search is still running. A finished search
+# can come back with None: there is no move on a full board.
+THINKING = object()
+
+class SearchWorker:
+    # Runs AI searches in a child process so a pygame loop can keep handling
+    # events while the AI thinks. One child serves a whole session, so its
+    # transposition table stays warm from move to move.
+    #
+    #     worker.start(board, time_budget)
+    #     ...every frame: col = worker.poll()   # THINKING while thinking
+    #
+    # With workers > 1 the child splits each search across a pool of that
+    # many processes (see ParallelSearch). With `stats_log` set, a single
+    # process search appends a SearchStats record per move to that JSONL file.
+    # With `cache_path` set, results are looked up in and added to that
+    # ResultCache file, which any number of workers can share.
+    #
+    # While the player thinks, worker.ponder(board, time_budget) searches
+    # the AI's answer to each reply they could make. If the next start() is
+    # for one of those positions the answer comes back at once; otherwise
+    # the search starts with the table the pondering filled.
+    #
+    # With `perfect` the child asks a PerfectPlayer first, which plays solved
+    # moves once the board holds solver.SOLVE_FROM stones (earlier only for
+    # positions in an opening book) and leaves the rest to the search.
+    def __init__(self, evaluator=DEFAULT, table_entries=1 << 20, perfect=False, workers=1, stats_log=None, cache_path=None):
+        self._conn, child_conn = multiprocessing.Pipe()
+        # Id of the job the parent still wants; any other job is cancelled
+        self._active = multiprocessing.Value("q", 0, lock=False)
+        self._nodes = multiprocessing.Value("q", 0, lock=False)
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(child_conn, self._active, self._nodes, evaluator, table_entries, perfect, workers, stats_log, cache_path),
+            # Daemonic processes cannot start a pool of their own
+            daemon=workers <= 1,
+        )
+        self._process.start()
+        child_conn.close()
+        self._job = 0
+        self.busy = False
+
+    @property
+    def nodes(self):
+        # Nodes searched so far for the current move
+        return self._nodes.value
+
+    def start(self, board, time_budget, max_depth=None, piece=AI_PIECE):
+        self.cancel()
+        self._job += 1
+        self._active.value = self._job
+        self._nodes.value = 0
+        board = board.copy()
+        board.set_turn(piece)
+        self._conn.send((self._job, board, time_budget, max_depth, False))
+        self.busy = True
+
+    def ponder(self, board, time_budget, max_depth=None, piece=PLAYER_PIECE):
+        # `piece` is the player about to move; runs until the next start()
+        # or cancel() and never answers poll()
+        self.cancel()
+        self._job += 1
+        self._active.value = self._job
+        board = board.copy()
+        board.set_turn(piece)
+        self._conn.send((self._job, board, time_budget, max_depth, True))
+
+    def poll(self):
+        # The chosen column once the search is done, otherwise THINKING
+        while self._conn.poll():
+            job, col = self._conn.recv()
+            if job == self._job and self.busy:
+                self.busy = False
+                return col
+        return THINKING
+
+    def cancel(self):
+        # The child drops the search at its next check; its late reply is ignored
+        self._active.value = 0
+        self.busy = False
+
+    def close(self):
+        self.cancel()
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(1)
+        if self._process.is_alive():
+            self._process.terminate()
+
+class _Cancelled:
+    def __init__(self, active, job):
+        self.active = active
+        self.job = job
+
+    def is_set(self):
+        return self.active.value != self.job
+
+def _serve(conn, active, nodes, evaluator, table_entries, perfect, workers, stats_log, cache_path):
+    if workers > 1:
+        search = ParallelSearch(evaluator, workers, table_entries // workers)
+    else:
+        search = Search(evaluator, TranspositionTable(table_entries))
+        if stats_log is not None:
+            search.stats = SearchStats()
+    search.progress = nodes
+    if cache_path is not None:
+        search.cache = ResultCache(cache_path)
+    perfect_player = PerfectPlayer() if perfect else None
+    # Canonical position key -> the column pondering chose there, mirrored
+    # along with the key
+    answers = {}
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            job = None
+        if job is None:
+            if workers > 1:
+                search.close()
+            return
+        job, board, time_budget, max_depth, ponder = job
+        search.stop = _Cancelled(active, job)
+        if search.stop.is_set():
+            continue
+        if ponder:
+            answers = _ponder(search, board, time_budget, max_depth)
+            continue
+        col = None
+        if perfect_player is not None and board.game is STANDARD:
+            # The solver only knows the standard board
+            col = perfect_player.move(board, board.piece)
+        if col is None:
+            key, mirrored = board.canonical_key()
+            col = answers.get(key)
+            if col is not None and mirrored:
+                col = board.game.columns - 1 - col
+        if col is None:
+            result = search.iterative_deepening(board, time_budget, board.piece == AI_PIECE, max_depth)
+            col = None if result is None else result[0]
+            if stats_log is not None and workers <= 1:
+                append_jsonl(stats_log, search.stats.record())
+        conn.send((job, col))
+
+def _ponder(search, board, time_budget, max_depth):
+    # Searches every reply from `board`, the one the last search expected
+    # first, each as long as a real move would take. Returns the answers
+    # found before the job was cancelled.
+    answers = {}
+    columns = board.game.columns
+    replies = board.game.center_order[:]
+    pv = getattr(search, "pv", [])
+    if len(pv) > 1 and board.history and pv[0] == board.history[-1]:
+        replies.remove(pv[1])
+        replies.insert(0, pv[1])
+    # On a symmetric board a reply and its mirror share one answer
+    symmetric = board.is_symmetric()
+    for col in replies:
+        if not board.can_play(col) or symmetric and col > columns // 2:
+            continue
+        board.play(col)
+        if not board.last_move_wins():
+            result = search.iterative_deepening(board, time_budget, board.piece == AI_PIECE, max_depth)
+            if search.stop.is_set():
+                board.undo()
+                break
+            if result is not None and result[0] is not None:
+                key, mirrored = board.canonical_key()
+                answers[key] = columns - 1 - result[0] if mirrored else result[0]
+        board.undo()
+    return answers
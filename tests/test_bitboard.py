@@ -0,0 +1,86 @@
+import random
+from connf_ai import bitboard
+from connf_ai.bitboard import AI_PIECE, PLAYER_PIECE, STANDARD, create_board, make_game
+
+GAMES = [make_game(), make_game(7, 8, 4), make_game(9, 9, 5), make_game(5, 5, 3), make_game(4, 6, 4)]
+
+def grid(board, piece):
+    game = board.game
+    return [[board.cell(r, c) == piece for c in range(game.columns)] for r in range(game.rows)]
+
+def lines(game):
+    # Every run of n cells in every direction, as (row, col) lists
+    for r in range(game.rows):
+        for c in range(game.columns):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                cells = [(r + dr * i, c + dc * i) for i in range(game.n)]
+                if all(0 <= rr < game.rows and 0 <= cc < game.columns for rr, cc in cells):
+                    yield cells
+
+def has_line(board, piece):
+    stones = grid(board, piece)
+    return any(all(stones[r][c] for r, c in cells) for cells in lines(board.game))
+
+def winning_cells(board, piece):
+    # Empty cells that would complete a run, as a mask
+    game = board.game
+    stones = grid(board, piece)
+    result = 0
+    for cells in lines(game):
+        empty = [(r, c) for r, c in cells if board.cell(r, c) == 0]
+        if len(empty) == 1 and sum(stones[r][c] for r, c in cells) == game.n - 1:
+            r, c = empty[0]
+            result |= game.bits[c][r]
+    return result
+
+def random_boards(game, count, seed=0):
+    # Boards from random play, carried on past wins so every kind of line shows up
+    rng = random.Random(seed)
+    for _ in range(count):
+        board = create_board(game)
+        for _ in range(rng.randrange(game.cells + 1)):
+            board.play(rng.choice([c for c in range(game.columns) if board.can_play(c)]))
+        yield board
+
+def test_win_detection_matches_scan():
+    for game in GAMES:
+        for board in random_boards(game, 60):
+            for piece in (PLAYER_PIECE, AI_PIECE):
+                stones = board.pieces(piece)
+                assert game.alignment(stones) == has_line(board, piece)
+                assert game.winning_cells(stones, board.mask) == winning_cells(board, piece)
+                if game is STANDARD:
+                    assert bitboard.alignment(stones) == has_line(board, piece)
+                    assert bitboard.winning_cells(stones, board.mask) == winning_cells(board, piece)
+
+def test_last_move_wins_matches_scan():
+    rng = random.Random(1)
+    for game in GAMES:
+        for _ in range(30):
+            board = create_board(game)
+            while not board.is_full():
+                piece = board.piece
+                board.play(rng.choice([c for c in range(game.columns) if board.can_play(c)]))
+                won = board.last_move_wins()
+                assert won == has_line(board, piece)
+                if won:
+                    break
+
+def test_play_undo_restores_position():
+    rng = random.Random(2)
+    for game in GAMES:
+        board = create_board(game)
+        saved = []
+        for _ in range(200):
+            if board.history and (board.is_full() or rng.random() < 0.4):
+                board.undo()
+                state = saved.pop()
+                assert (board.current, board.mask, board.key(), board.mirror_current, board.mirror_mask,
+                        board.heights, board.piece, board.history) == state
+            else:
+                saved.append((board.current, board.mask, board.key(), board.mirror_current, board.mirror_mask,
+                              board.heights[:], board.piece, board.history[:]))
+                board.play(rng.choice([c for c in range(game.columns) if board.can_play(c)]))
+            # The mirror fields follow the board
+            assert board.mirror_mask == game.mirror(board.mask)
+            assert board.mirror_current == game.mirror(board.current)
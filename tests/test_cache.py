@@ -0,0 +1,73 @@
+import numpy as np
+from connf_ai.bitboard import create_board, make_game
+from connf_ai.cache import CACHE_VERSION, HEADER_DTYPE, WAYS, ResultCache
+from connf_ai.evaluation import DEFAULT, DEFENSIVE
+
+def board(*moves, game=None):
+    board = create_board() if game is None else create_board(game)
+    for col in moves:
+        board.play(col)
+    return board
+
+def test_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.c4c"), 256)
+    position = board(3, 3, 2)
+    assert cache.probe(position, 5, DEFAULT, 16) is None
+    cache.store(position, 5, DEFAULT, 16, 4, -12)
+    assert cache.probe(position, 5, DEFAULT, 16) == (4, -12)
+    assert cache.probe(position, 6, DEFAULT, 16) is None
+    cache.store(position, 6, DEFAULT, 16, None, 0)
+    assert cache.probe(position, 6, DEFAULT, 16) == (None, 0)
+    # Another process opening the file sees the same entries
+    cache.close()
+    assert ResultCache(str(tmp_path / "results.c4c")).probe(position, 5, DEFAULT, 16) == (4, -12)
+
+def test_mirrored_position(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.c4c"), 256)
+    cache.store(board(1, 2), 5, DEFAULT, 16, 1, 7)
+    # 1 and 2 mirrored on seven columns
+    assert cache.probe(board(5, 4), 5, DEFAULT, 16) == (5, 7)
+
+def test_clock_eviction(tmp_path):
+    # One bucket: every entry competes for the same WAYS slots
+    cache = ResultCache(str(tmp_path / "results.c4c"), WAYS)
+    # None of them the mirror image of another
+    positions = [board(col) for col in range(4)] + [board(col, col) for col in range(WAYS - 2)]
+    for i, position in enumerate(positions[:WAYS]):
+        cache.store(position, 3, DEFAULT, 16, 0, i)
+    # The first entry has been used since it was stored, so the hand passes it
+    assert cache.probe(positions[0], 3, DEFAULT, 16) == (0, 0)
+    cache.store(positions[WAYS], 3, DEFAULT, 16, 0, WAYS)
+    assert cache.probe(positions[1], 3, DEFAULT, 16) is None
+    assert cache.probe(positions[0], 3, DEFAULT, 16) == (0, 0)
+    assert cache.probe(positions[WAYS], 3, DEFAULT, 16) == (0, WAYS)
+    assert cache.stats()["used"] == WAYS
+
+def test_other_versions_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.c4c"), 256)
+    position = board(3)
+    cache.store(position, 4, DEFAULT, 16, 3, 9)
+    assert cache.probe(position, 4, DEFENSIVE, 16) is None
+    assert cache.probe(position, 4, DEFAULT, 0) is None
+    # The empty boards of two games have the same key
+    cache.store(board(), 4, DEFAULT, 16, 3, 9)
+    assert cache.probe(board(game=make_game(7, 8, 4)), 4, DEFAULT, 16) is None
+
+def test_other_file_version_is_recreated(tmp_path):
+    path = str(tmp_path / "results.c4c")
+    cache = ResultCache(path, 256)
+    cache.store(board(3), 4, DEFAULT, 16, 3, 9)
+    cache.close()
+    header = np.memmap(path, HEADER_DTYPE, "r+", 0, (1,))
+    header["version"] = CACHE_VERSION + 1
+    header.flush()
+    del header
+    cache = ResultCache(path, 256)
+    assert cache.stats()["used"] == 0
+    assert cache.probe(board(3), 4, DEFAULT, 16) is None
+    # A file cut short is not a cache either
+    cache.store(board(3), 4, DEFAULT, 16, 3, 9)
+    cache.close()
+    with open(path, "r+b") as f:
+        f.truncate(HEADER_DTYPE.itemsize + 10)
+    assert ResultCache(path, 256).probe(board(3), 4, DEFAULT, 16) is None
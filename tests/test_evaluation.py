@@ -0,0 +1,70 @@
+import random
+from connf_ai.bitboard import AI_PIECE, EMPTY, PLAYER_PIECE, create_board, make_game
+from connf_ai.evaluation import PRESETS, IncrementalScore
+
+def evaluate_window(window, piece, evaluator, n):
+    # The window scoring the evaluator's table stands for, spelled out
+    three, two, opp_three, four = evaluator.weights
+    opp = PLAYER_PIECE + AI_PIECE - piece
+    empty = window.count(EMPTY)
+    score = 0
+    if window.count(piece) == n:
+        score += four
+    elif window.count(piece) == n - 1 and empty == 1:
+        score += three
+    elif window.count(piece) == n - 2 and empty == 2:
+        score += two
+    if window.count(opp) == n - 1 and empty == 1:
+        score += opp_three
+    return score
+
+def scan(grid, piece, evaluator, n):
+    # Full rescan of a grid of rows, every window of n in every direction
+    rows, columns = len(grid), len(grid[0])
+    score = [grid[r][columns // 2] for r in range(rows)].count(piece) * evaluator.center
+    for r in range(rows):
+        for c in range(columns):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                end_r, end_c = r + dr * (n - 1), c + dc * (n - 1)
+                if 0 <= end_r < rows and end_c < columns:
+                    window = [grid[r + dr * i][c + dc * i] for i in range(n)]
+                    score += evaluate_window(window, piece, evaluator, n)
+    return score
+
+def check(board, score, evaluator):
+    game = board.game
+    grid = [[board.cell(r, c) for c in range(game.columns)] for r in range(game.rows)]
+    for piece in (PLAYER_PIECE, AI_PIECE):
+        assert score.scores[piece] == evaluator.score_position(board, piece)
+        # Row 0 at the bottom and at the top: the windows are the same set
+        assert score.scores[piece] == scan(grid, piece, evaluator, game.n)
+        assert score.scores[piece] == scan(grid[::-1], piece, evaluator, game.n)
+
+def play_and_undo(game, evaluator, seed, steps=60):
+    rng = random.Random(seed)
+    board = create_board(game)
+    score = IncrementalScore(evaluator, board)
+    for _ in range(steps):
+        if board.history and (board.is_full() or rng.random() < 0.3):
+            col = board.history[-1]
+            board.undo()
+            score.remove(col * game.stride + board.heights[col], board.piece)
+        else:
+            col = rng.choice([c for c in range(game.columns) if board.can_play(c)])
+            cell = col * game.stride + board.heights[col]
+            piece = board.piece
+            board.play(col)
+            score.add(cell, piece)
+        check(board, score, evaluator)
+    # Starting from a position part way through gives the same scores too
+    check(board, IncrementalScore(evaluator, board), evaluator)
+
+def test_incremental_score_matches_rescan():
+    for evaluator in PRESETS.values():
+        for seed in range(10):
+            play_and_undo(make_game(), evaluator, seed)
+
+def test_incremental_score_other_games():
+    for game in (make_game(7, 8, 4), make_game(9, 9, 5), make_game(5, 5, 3)):
+        for evaluator in PRESETS.values():
+            play_and_undo(game, evaluator, 0)
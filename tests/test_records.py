@@ -0,0 +1,114 @@
+import random
+import numpy as np
+import pytest
+from connf_ai.bitboard import AI_PIECE, COLUMN_COUNT, PLAYER_PIECE, ROW_COUNT, create_board
+from connf_ai.records import (DRAW, FILE_HEADER, FLAG_PONDER, RECORD_MAGIC, RECORD_VERSION, UNFINISHED,
+                              RecordWriter, all_boards, boards_at, read_records)
+
+def random_game(rng):
+    # Columns played and the result of a random game
+    board = create_board()
+    moves = []
+    while not board.is_full():
+        col = rng.choice([c for c in range(COLUMN_COUNT) if board.can_play(c)])
+        piece = board.piece
+        board.play(col)
+        moves.append(col)
+        if board.last_move_wins():
+            return moves, piece
+    return moves, DRAW
+
+def replay(moves, first):
+    # Grid after `moves`, row 0 at the bottom
+    grid = np.zeros((ROW_COUNT, COLUMN_COUNT), dtype=np.int8)
+    heights = [0] * COLUMN_COUNT
+    piece = first
+    for col in moves:
+        grid[heights[col], col] = piece
+        heights[col] += 1
+        piece = PLAYER_PIECE + AI_PIECE - piece
+    return grid
+
+def write_games(path, count=8, seed=0):
+    rng = random.Random(seed)
+    writer = RecordWriter(path, "defensive", 500, 6, FLAG_PONDER)
+    games = []
+    for _ in range(count):
+        moves, result = random_game(rng)
+        # random_game always starts with PLAYER_PIECE; record half as AI first
+        first = rng.choice((PLAYER_PIECE, AI_PIECE))
+        if first == AI_PIECE and result != DRAW:
+            result = PLAYER_PIECE + AI_PIECE - result
+        writer.start(first)
+        for col in moves:
+            writer.move(col)
+        writer.finish(result)
+        games.append((first, moves, result))
+    # A game left open is written as unfinished by close()
+    writer.start(PLAYER_PIECE)
+    writer.move(3)
+    writer.close()
+    games.append((PLAYER_PIECE, [3], UNFINISHED))
+    return games
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    games = write_games(path)
+    records = read_records(path)
+    assert len(records) == len(games)
+    for record, (first, moves, result) in zip(records, games):
+        assert record["length"] == len(moves)
+        assert record["first"] == first
+        assert record["result"] == result
+        assert record["flags"] == FLAG_PONDER
+        assert record["time_budget"] == 500
+        assert record["max_depth"] == 6
+        assert record["evaluator"] == b"defensive"
+        assert list(record["moves"][:len(moves)]) == moves
+
+def test_boards_at(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    games = write_games(path)
+    records = read_records(path)
+    for ply in (0, 1, 7, 20):
+        boards, index = boards_at(records, ply)
+        assert boards.shape == (len(index), ROW_COUNT, COLUMN_COUNT) and boards.dtype == np.int8
+        assert list(index) == [i for i, (_, moves, _) in enumerate(games) if len(moves) >= ply]
+        for board, i in zip(boards, index):
+            first, moves, _ = games[i]
+            assert (board == replay(moves[:ply], first)).all()
+
+def test_all_boards(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    games = write_games(path)
+    boards, index, plies = all_boards(read_records(path))
+    assert len(boards) == sum(len(moves) + 1 for _, moves, _ in games)
+    seen = set()
+    for board, i, ply in zip(boards, index, plies):
+        first, moves, _ = games[i]
+        assert (board == replay(moves[:ply], first)).all()
+        seen.add((int(i), int(ply)))
+    assert len(seen) == len(boards)
+
+def test_bad_files(tmp_path):
+    path = str(tmp_path / "games.c4r")
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, ROW_COUNT, COLUMN_COUNT)[:3])
+    with pytest.raises(ValueError):
+        read_records(path)
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(b"NOPE", RECORD_VERSION, ROW_COUNT, COLUMN_COUNT))
+    with pytest.raises(ValueError):
+        read_records(path)
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION + 1, ROW_COUNT, COLUMN_COUNT))
+    with pytest.raises(ValueError):
+        read_records(path)
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, ROW_COUNT + 1, COLUMN_COUNT))
+    with pytest.raises(ValueError):
+        read_records(path)
+    # A header and no games yet reads as an empty array
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, ROW_COUNT, COLUMN_COUNT))
+    assert len(read_records(path)) == 0
@@ -0,0 +1,41 @@
+import random
+from connf_ai.bitboard import COLUMN_COUNT, COLUMN_MASK, create_board, possible, winning_cells
+from connf_ai.solver import CELLS, Solver
+
+def brute_force(current, mask, memo):
+    # Plain negamax over every move, in the solver's score convention
+    key = (current, mask)
+    if key in memo:
+        return memo[key]
+    moves = mask.bit_count()
+    playable = possible(mask)
+    if winning_cells(current, mask) & playable:
+        return (CELLS + 1 - moves) // 2
+    best = 0 if moves == CELLS else None
+    for col in range(COLUMN_COUNT):
+        move = playable & COLUMN_MASK[col]
+        if move:
+            score = -brute_force(current ^ mask, mask | move, memo)
+            if best is None or score > best:
+                best = score
+    memo[key] = best
+    return best
+
+def late_positions(count, seed=0):
+    # Random games stopped 30 to 34 stones in, before anyone has won
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = create_board()
+        for _ in range(rng.randint(30, 34)):
+            board.play(rng.choice([col for col in range(COLUMN_COUNT) if board.can_play(col)]))
+            if board.last_move_wins():
+                break
+        else:
+            positions.append((board.current, board.mask))
+    return positions
+
+def test_solve_matches_brute_force():
+    memo = {}
+    for current, mask in late_positions(40):
+        assert Solver().solve(current, mask) == brute_force(current, mask, memo)